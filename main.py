@@ -1,6 +1,475 @@
-def main():
-    print("Hello from empow-tiktok!")
+"""命令行入口
+
+批量提交、运行、等待、导出任务以及缓存维护。各子命令只在执行时导入所需模块，
+避免每次启动都加载完整的 ``src.core`` 并连接Apify。
+
+示例::
+
+    python main.py submit tasks.jsonl
+    python main.py run --concurrency 8
+    python main.py wait --timeout 3600
+    python main.py export <task_id> -o products.jsonl
+    python main.py status
+    python main.py cache retention --max-age-days 7
+    python main.py bench-json --items 20000
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+from contextlib import suppress
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+def _print(*values: Any):
+    """逐行输出并立即刷新，便于管道实时消费"""
+    print(*values, flush=True)
+
+
+_log_handler: Optional[int] = None
+
+
+def _setup_logging(level: str):
+    """日志输出到stderr，stdout只保留命令结果
+
+    先添加新处理器再移除旧处理器，级别无效时保留原有输出。
+    """
+    global _log_handler
+    from loguru import logger
+
+    handler_id = logger.add(sys.stderr, level=level,
+                            format="<green>{time:HH:mm:ss}</green> | <level>{level}</level> | {message}")
+    old_handler, _log_handler = _log_handler, handler_id
+    if old_handler is None:
+        with suppress(ValueError):
+            logger.remove(0)  # 移除默认处理器
+    else:
+        logger.remove(old_handler)
+
+
+def _follow_log_level(changes: Dict[str, Any]):
+    """热加载时日志级别跟随配置中的 ``APP_LOG_LEVEL``"""
+    if "app.log_level" in changes:
+        _setup_logging(changes["app.log_level"][1])
+
+
+def _read_specs(path: str, fmt: str) -> Iterator[Tuple[int, Optional[Dict[str, Any]], Optional[str]]]:
+    """读取任务定义文件，逐条返回 ``(行号, 定义, 解析错误)``
+
+    JSONL每行一个对象；CSV需要 ``name``、``actor_id`` 列，``input_data`` 列为JSON字符串，
+    ``tags`` 列以逗号分隔，其余非空列作为TaskConfig字段（如 ``max_items``、``timeout``）。
+    """
+    if fmt == "auto":
+        fmt = "csv" if path.lower().endswith(".csv") else "jsonl"
+
+    stream = sys.stdin if path == "-" else open(path, 'r', encoding='utf-8', newline='')
+    try:
+        if fmt == "jsonl":
+            for line_no, line in enumerate(stream, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_no, json.loads(line), None
+                except json.JSONDecodeError as e:
+                    yield line_no, None, f"JSON格式错误: {e}"
+            return
+
+        reader = csv.DictReader(stream)
+        for row in reader:
+            spec: Dict[str, Any] = {k: v for k, v in row.items() if k and v not in (None, "")}
+            try:
+                if "input_data" in spec:
+                    spec["input_data"] = json.loads(spec["input_data"])
+            except json.JSONDecodeError as e:
+                yield reader.line_num, None, f"input_data不是有效的JSON: {e}"
+                continue
+            if "tags" in spec:
+                spec["tags"] = [tag.strip() for tag in spec["tags"].split(",") if tag.strip()]
+            yield reader.line_num, spec, None
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def cmd_submit(args: argparse.Namespace) -> int:
+    """批量提交任务，无效的行跳过并报告行号"""
+    from src.task_manager import task_manager
+
+    submitted: List[str] = []
+    invalid = 0
+    batch = []
+    for line_no, spec, error in _read_specs(args.file, args.format):
+        if error is None:
+            try:
+                batch.append(task_manager.build_task(spec))
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            invalid += 1
+            _print(json.dumps({"line": line_no, "error": error}, ensure_ascii=False))
+            continue
+        if len(batch) >= args.batch_size:
+            submitted.extend(_submit_batch(task_manager, batch))
+            batch = []
+    if batch:
+        submitted.extend(_submit_batch(task_manager, batch))
+
+    _print(json.dumps({"submitted": len(submitted), "invalid": invalid}))
+    code = 1 if invalid else 0
+    if args.run and submitted:
+        # 只运行本次提交的任务，不包括其他进程提交的待执行任务
+        args.task_ids = submitted
+        code = max(code, cmd_run(args))
+    return code
+
+
+def _submit_batch(task_manager, tasks: List[Any]) -> List[str]:
+    for task in task_manager.add_tasks(tasks):
+        _print(json.dumps({"task_id": task.id, "name": task.name, "status": task.status}))
+    return [task.id for task in tasks]
+
+
+def cmd_run(args: argparse.Namespace) -> int:
+    """以N并发运行待执行任务，直到队列排空"""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    from src.task_manager import TaskStatus, task_manager
+
+    if getattr(args, "watch_config", False):
+        from src.config import config_manager
+        config_manager.subscribe(_follow_log_level)
+        config_manager.start_watching()
+
+    failed = 0
+    if args.task_ids:
+        task_ids = []
+        for task_id in args.task_ids:
+            if task_manager.get_task(task_id) is None:
+                failed += 1
+                _print(json.dumps({"task_id": task_id, "error": "任务不存在"}, ensure_ascii=False))
+            else:
+                task_ids.append(task_id)
+    else:
+        pending = task_manager.list_tasks(status=TaskStatus.PENDING)
+        # list_tasks按创建时间倒序，先提交的先运行
+        task_ids = [task.id for task in reversed(pending)]
+    if args.limit:
+        task_ids = task_ids[:args.limit]
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = {executor.submit(task_manager.run_task, task_id): task_id
+                   for task_id in task_ids}
+        for future in as_completed(futures):
+            task = task_manager.get_task(futures[future])
+            success = future.exception() is None and future.result()
+            failed += 0 if success else 1
+            if task is None:
+                # 运行期间被其他进程删除或归档
+                _print(json.dumps({"task_id": futures[future], "error": "任务不存在"},
+                                  ensure_ascii=False))
+                continue
+            _print(json.dumps({
+                "task_id": task.id,
+                "status": task.status,
+                "result_count": task.result_count,
+                "error_count": task.summary.error_count if task.summary else None,
+                "error": task.error_message,
+            }, ensure_ascii=False))
+
+    _print(json.dumps({"ran": len(task_ids), "failed": failed}))
+    return 1 if failed else 0
+
+
+def cmd_wait(args: argparse.Namespace) -> int:
+    """等待任务结束（可观察其他进程中运行的任务）"""
+    from src.task_manager import TaskStatus, task_manager
+
+    active = {TaskStatus.PENDING, TaskStatus.RUNNING}
+    deadline = time.monotonic() + args.timeout if args.timeout else None
+
+    while True:
+        task_manager.reload()
+        if args.task_ids:
+            tasks = [task_manager.get_task(task_id) for task_id in args.task_ids]
+            missing = [tid for tid, task in zip(args.task_ids, tasks) if task is None]
+            if missing:
+                _print(json.dumps({"missing": missing}))
+                return 1
+        else:
+            tasks = task_manager.list_tasks()
+
+        waiting = [task for task in tasks
+                   if task.status == TaskStatus.RUNNING
+                   or (args.include_pending and task.status in active)]
+        if not waiting:
+            _print(json.dumps({"waiting": 0}))
+            return 0
+        if deadline and time.monotonic() >= deadline:
+            _print(json.dumps({"waiting": len(waiting), "timeout": True}))
+            return 2
+
+        _print(json.dumps({"waiting": len(waiting)}))
+        interval = args.interval
+        if deadline:
+            interval = min(interval, max(0.0, deadline - time.monotonic()))
+        time.sleep(interval)
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    """导出任务结果，json/jsonl格式逐页写出"""
+    from src import serialization
+    from src.apify_service import apify_client
+    from src.task_manager import task_manager
+
+    task = task_manager.get_task(args.task_id)
+    if not task or not task.dataset_id:
+        _print(json.dumps({"error": f"任务或数据集不存在: {args.task_id}"}, ensure_ascii=False))
+        return 1
+
+    output = sys.stdout.buffer if args.output == "-" else open(args.output, 'wb')
+    count = 0
+    try:
+        if args.format == "jsonl":
+            for item in apify_client.iterate_dataset_items(
+                    task.dataset_id, limit=args.limit, account=task.account):
+                output.write(serialization.dumps(item) + b"\n")
+                count += 1
+        elif args.format == "json":
+            output.write(b"[")
+            for item in apify_client.iterate_dataset_items(
+                    task.dataset_id, limit=args.limit, account=task.account):
+                output.write((b"," if count else b"") + serialization.dumps(item))
+                count += 1
+            output.write(b"]\n")
+        else:
+            data = apify_client.download_dataset(task.dataset_id, format=args.format,
+                                                account=task.account)
+            if data is None:
+                return 1
+            output.write(data)
+        output.flush()
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+
+    if args.output != "-":
+        _print(json.dumps({"task_id": task.id, "output": args.output, "items": count or None}))
+    return 0
+
+
+def cmd_status(args: argparse.Namespace) -> int:
+    """显示配置与任务统计"""
+    from collections import Counter
+
+    from src.config import config_manager
+    from src.task_manager import task_manager
+
+    tasks = task_manager.list_tasks()
+    counts = Counter(task.status for task in tasks)
+    _print(json.dumps({
+        "configured": config_manager.is_configured(),
+        "config_validation": config_manager.validate_config(),
+        "data_dir": config_manager.app.data_dir,
+        "task_count": len(tasks),
+        "by_status": dict(counts),
+    }, ensure_ascii=False, indent=None if args.compact else 2))
+
+    if args.tasks:
+        for task in tasks[:args.tasks]:
+            _print(json.dumps({
+                "task_id": task.id, "name": task.name, "status": task.status,
+                "created_at": task.created_at.isoformat(), "result_count": task.result_count,
+            }, ensure_ascii=False))
+    return 0
+
+
+def cmd_summary(args: argparse.Namespace) -> int:
+    """显示任务结果摘要"""
+    from src.task_manager import task_manager
+
+    summary = task_manager.get_task_summary(args.task_id, refresh=args.refresh)
+    if summary is None:
+        _print(json.dumps({"error": f"任务摘要不可用: {args.task_id}"}, ensure_ascii=False))
+        return 1
+
+    if not args.preview:
+        _print(summary.json())
+        return 0
+
+    # 预览单独保存，输出时合并到同一行
+    payload = json.loads(summary.json())
+    payload["preview"] = task_manager.get_task_preview(args.task_id)
+    _print(json.dumps(payload, ensure_ascii=False, default=str))
+    return 0
+
+
+def cmd_cache(args: argparse.Namespace) -> int:
+    """缓存与历史数据维护"""
+    if args.action == "retention":
+        from src.task_manager import RetentionPolicy, task_manager
+
+        policy = RetentionPolicy(max_age_days=args.max_age_days, max_tasks=args.max_tasks)
+        result = {"archived": task_manager.apply_retention(policy)}
+    elif args.action == "compact":
+        from src.change_tracker import ProductChangeTracker
+        from src.task_manager import task_manager
+
+        from src.media import MediaDownloader
+
+        result = task_manager.compact_archive()
+        ProductChangeTracker().compact()
+        MediaDownloader().compact_index()
+    elif args.action == "purge-archive":
+        from datetime import date
+
+        from src.task_manager import task_manager
+
+        if not args.before:
+            _print(json.dumps({"error": "purge-archive需要 --before YYYY-MM-DD"}))
+            return 1
+        result = {"removed": task_manager.purge_archive(date.fromisoformat(args.before))}
+    else:
+        from src.media import MediaDownloader
+
+        downloader = MediaDownloader()
+        result = {"partial_removed": downloader.cleanup_partial(),
+                  "media_bytes": downloader.total_bytes}
+
+    _print(json.dumps(result))
+    return 0
+
+
+def _sample_items(count: int) -> List[Dict[str, Any]]:
+    """生成结构接近TikTok商品数据集的样本"""
+    import random
+
+    rng = random.Random(42)
+    return [{
+        "id": str(7300000000000000000 + index),
+        "title": f"夏季新款 商品 {index} — Summer item",
+        "price": round(rng.uniform(1, 500), 2),
+        "currency": "USD",
+        "sold_count": rng.randint(0, 100000),
+        "rating": round(rng.uniform(1, 5), 1),
+        "shop": {"id": str(rng.randint(1, 10 ** 9)), "name": f"shop-{index % 500}",
+                 "verified": index % 3 == 0},
+        "images": [f"https://p16.example.com/img/{index}-{n}.jpeg" for n in range(4)],
+        "skus": [{"sku_id": f"{index}-{n}", "price": rng.uniform(1, 500), "stock": rng.randint(0, 999)}
+                 for n in range(3)],
+        "description": None if index % 7 == 0 else "轻薄透气 " * 10,
+    } for index in range(count)]
+
+
+def cmd_bench_json(args: argparse.Namespace) -> int:
+    """对比各JSON编解码器在数据集样本上的编解码速度"""
+    from src import serialization
+
+    items = _sample_items(args.items)
+    for name in serialization.available_codecs():
+        _, dumps, loads = serialization.get_codec(name)
+        best_dump = best_load = float("inf")
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            data = dumps(items)
+            best_dump = min(best_dump, time.perf_counter() - started)
+            started = time.perf_counter()
+            loads(data)
+            best_load = min(best_load, time.perf_counter() - started)
+
+        _print(json.dumps({
+            "codec": name,
+            "active": name == serialization.codec_name,
+            "items": args.items,
+            "bytes": len(data),
+            "dumps_ms": round(best_dump * 1000, 2),
+            "loads_ms": round(best_load * 1000, 2),
+            "items_per_second": round(args.items / (best_dump + best_load)),
+        }))
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """构建命令行解析器"""
+    parser = argparse.ArgumentParser(prog="empow-tiktok", description="Apify数据集成工具")
+    parser.add_argument("--log-level", default="WARNING", help="日志级别 (默认WARNING)")
+    subparsers = parser.add_subparsers(dest="command")
+
+    submit = subparsers.add_parser("submit", help="从CSV/JSONL文件批量提交任务")
+    submit.add_argument("file", help="任务定义文件，- 表示stdin")
+    submit.add_argument("--format", choices=["auto", "csv", "jsonl"], default="auto")
+    submit.add_argument("--batch-size", type=int, default=1000, help="每批保存的任务数")
+    submit.add_argument("--run", action="store_true", help="提交后立即运行本次提交的任务")
+    submit.add_argument("--concurrency", "-n", type=int, default=4)
+    submit.add_argument("--limit", type=int, default=None)
+    submit.set_defaults(func=cmd_submit)
+
+    run = subparsers.add_parser("run", help="并发运行待执行任务")
+    run.add_argument("task_ids", nargs="*", help="指定任务ID，默认全部待执行任务")
+    run.add_argument("--concurrency", "-n", type=int, default=4)
+    run.add_argument("--limit", type=int, default=None, help="最多运行的任务数")
+    run.add_argument("--watch-config", action="store_true",
+                     help="运行期间监视.env，Token、连接设置与日志级别变更即时生效")
+    run.set_defaults(func=cmd_run)
+
+    wait = subparsers.add_parser("wait", help="等待任务结束")
+    wait.add_argument("task_ids", nargs="*")
+    wait.add_argument("--timeout", type=float, default=None, help="超时秒数")
+    wait.add_argument("--interval", type=float, default=5.0, help="轮询间隔秒数")
+    wait.add_argument("--include-pending", action="store_true", help="同时等待待执行任务")
+    wait.set_defaults(func=cmd_wait)
+
+    export = subparsers.add_parser("export", help="导出任务结果")
+    export.add_argument("task_id")
+    export.add_argument("--format", default="jsonl",
+                        help="jsonl/json为流式导出，其他格式(csv/xlsx/xml)由Apify生成")
+    export.add_argument("--output", "-o", default="-", help="输出文件，默认stdout")
+    export.add_argument("--limit", type=int, default=None)
+    export.set_defaults(func=cmd_export)
+
+    status = subparsers.add_parser("status", help="显示系统状态")
+    status.add_argument("--tasks", type=int, default=0, help="同时列出最近N个任务")
+    status.add_argument("--compact", action="store_true", help="单行输出")
+    status.set_defaults(func=cmd_status)
+
+    summary = subparsers.add_parser("summary", help="显示任务结果摘要")
+    summary.add_argument("task_id")
+    summary.add_argument("--preview", action="store_true", help="同时输出预览数据")
+    summary.add_argument("--refresh", action="store_true", help="重新遍历数据集计算")
+    summary.set_defaults(func=cmd_summary)
+
+    cache = subparsers.add_parser("cache", help="缓存与历史数据维护")
+    cache.add_argument("action", choices=["retention", "compact", "purge-archive", "clean-media"])
+    cache.add_argument("--max-age-days", type=int, default=30)
+    cache.add_argument("--max-tasks", type=int, default=1000)
+    cache.add_argument("--before", default=None, help="purge-archive的截止日期")
+    cache.set_defaults(func=cmd_cache)
+
+    bench = subparsers.add_parser("bench-json", help="JSON编解码性能对比")
+    bench.add_argument("--items", type=int, default=10000, help="样本数据项数量")
+    bench.add_argument("--repeat", type=int, default=5, help="重复次数，取最快一次")
+    bench.set_defaults(func=cmd_bench_json)
+
+    return parser
+
+
+def main(argv: List[str] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if not args.command:
+        parser.print_help()
+        return 0
+
+    from src.config import LOG_LEVELS
+
+    level = args.log_level.upper()
+    if level not in LOG_LEVELS:
+        parser.error(f"未知的日志级别: {args.log_level}，可选: {', '.join(LOG_LEVELS)}")
+    _setup_logging(level)
+    return args.func(args)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -12,8 +12,9 @@ from datetime import datetime
 from dotenv import load_dotenv
 load_dotenv()
 
-# 导入ApifyClient
-from apify_client import ApifyClient
+from src.client_factory import client_factory
+from src.profiling import task_profiler
+from src import serialization
 
 
 class ApifyDataScraper:
@@ -30,8 +31,8 @@ class ApifyDataScraper:
         if not self.api_token:
             raise ValueError("APIFY_API_TOKEN 未配置")
         
-        # 初始化ApifyClient
-        self.client = ApifyClient(self.api_token)
+        # 与src中的服务共用客户端和连接池
+        self.client = client_factory.apify_client(self.api_token)
     
     def run_actor(self, actor_id: str, run_input: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """运行指定的Actor"""
@@ -80,24 +81,49 @@ class ApifyDataScraper:
         
         return []
     
-    def save_data(self, data: List[Dict[str, Any]], filename: str = None) -> str:
-        """保存数据到文件"""
+    def stream_dataset_data(self, dataset_id: str, pipeline, limit: int = 1000,
+                            page_size: int = 100) -> int:
+        """分页读取数据集并逐条送入后处理流水线，返回送入数量"""
+        print(f"📁 流式获取数据集: {dataset_id}")
+        
+        dataset = self.client.dataset(dataset_id)
+        count = 0
+        while count < limit:
+            page = dataset.list_items(offset=count, limit=min(page_size, limit - count))
+            if not page.items:
+                break
+            
+            # 下游阻塞时这里也会阻塞（背压），不会在内存中堆积整个数据集
+            pipeline.feed(page.items)
+            count += len(page.items)
+            if len(page.items) < page_size:
+                break
+        
+        return count
+    
+    def save_data(self, data: List[Dict[str, Any]], filename: str = None,
+                  pretty: bool = False) -> str:
+        """保存数据到文件（默认紧凑格式，pretty为True时缩进输出）"""
         if not filename:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             filename = f"apify_data_{timestamp}.json"
         
         filepath = self.data_dir / filename
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        serialization.dump_file(data, filepath, pretty=pretty)
         
         return str(filepath)
     
     def scrape_data(self, actor_id: str = "QwlnuM1ok9nxykQjF", 
                    start_url: str = "https://www.tiktok.com/shop/pdp/summer-fashion-camouflage-knee-jeans-retro-style-comfortable-fit/1731283688180650724?source=ecommerce_store&enter_from=ecommerce_store&enter_method=feed_list_store_list_product",
                    max_items: int = 100,
-                   use_test_mode: bool = False) -> Dict[str, Any]:
-        """执行数据爬取"""
+                   use_test_mode: bool = False,
+                   pipeline=None) -> Dict[str, Any]:
+        """执行数据爬取
+
+        传入 ``pipeline`` (src.pipeline.Pipeline) 时结果逐页流入流水线，
+        由流水线的落盘阶段负责保存，不再一次性写入JSON文件。
+        """
         if use_test_mode:
             print("🧪 使用测试模式 - 爬取网页内容...")
             # 使用通用网页爬虫进行测试
@@ -128,8 +154,26 @@ class ApifyDataScraper:
         
         print(f"📁 数据集ID: {dataset_id}")
         
+        if pipeline is not None:
+            data_count = self.stream_dataset_data(dataset_id, pipeline, max_items)
+            pipeline_stats = pipeline.close()
+            print(f"📦 流水线处理 {data_count} 条数据")
+            return {
+                "success": data_count > 0,
+                "message": "" if data_count else "未获取到数据，数据集可能为空",
+                "run_id": run_result.get('id'),
+                "dataset_id": dataset_id,
+                "data_count": data_count,
+                "pipeline_stats": pipeline_stats,
+                "run_info": run_result
+            }
+        
+        # 剖析报告以run ID归档（需开启 APP_PROFILE_ENABLED）
+        profile_id = run_result.get('id')
+        
         # 获取数据 (增加重试机制)
-        data = self.get_dataset_data(dataset_id, max_items, max_retries=5)
+        with task_profiler.profile(profile_id, "get_dataset_data"):
+            data = self.get_dataset_data(dataset_id, max_items, max_retries=5)
         if not data:
             # 尝试直接从API获取数据集信息
             try:
@@ -142,7 +186,8 @@ class ApifyDataScraper:
         print(f"📦 获取到 {len(data)} 条数据")
         
         # 保存数据
-        filepath = self.save_data(data)
+        with task_profiler.profile(profile_id, "save_data"):
+            filepath = self.save_data(data)
         print(f"💾 数据已保存到: {filepath}")
         
         # 显示数据预览
@@ -4,14 +4,23 @@
 """
 
 import asyncio
-from typing import Dict, List, Optional, Any
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Any
 from datetime import datetime
 
 from apify_client import ApifyClient
 from loguru import logger
 from pydantic import BaseModel
 
+from .client_factory import client_factory
 from .config import config_manager
+from . import serialization
+
+# 运行/数据集ID到账号的路由表上限，长期运行的进程中按最近使用淘汰旧条目
+MAX_ROUTES = 10000
 
 
 class ActorRun(BaseModel):
@@ -23,6 +32,8 @@ class ActorRun(BaseModel):
     finished_at: Optional[datetime] = None
     stats: Optional[Dict[str, Any]] = None
     output: Optional[Dict[str, Any]] = None
+    default_dataset_id: Optional[str] = None
+    account: Optional[str] = None
 
 
 class DatasetItem(BaseModel):
@@ -32,12 +43,66 @@ class DatasetItem(BaseModel):
     created_at: datetime = datetime.now()
 
 
+class TokenSlot:
+    """Token池中的单个账号"""
+    
+    def __init__(self, token: str, client: ApifyClient):
+        # 账号标识只保留Token哈希前缀，可安全写入任务记录和日志
+        self.account = hashlib.sha256(token.encode("utf-8")).hexdigest()[:12]
+        self.client = client
+        self.active_runs = 0
+        self.total_runs = 0
+        self.failures = 0
+        self.cooldown_until = 0.0
+    
+    def is_cooling(self, now: float) -> bool:
+        return self.cooldown_until > now
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "account": self.account,
+            "active_runs": self.active_runs,
+            "total_runs": self.total_runs,
+            "failures": self.failures,
+            "cooling": self.is_cooling(time.time())
+        }
+
+
+def _is_quota_error(error: Exception) -> bool:
+    """判断是否为配额/限流类错误（可切换到其他账号重试）"""
+    status_code = getattr(error, "status_code", None)
+    if status_code in (402, 429):
+        return True
+    
+    message = f"{getattr(error, 'type', '')} {error}".lower()
+    return any(word in message for word in (
+        "rate-limit", "rate limit", "quota", "usage", "memory-limit", "limit-exceeded"
+    ))
+
+
 class ApifyDataClient:
-    """Apify数据客户端"""
+    """Apify数据客户端
+    
+    配置多个Token时为每个账号创建独立客户端：新的运行分配给当前并发最少的账号，
+    遇到配额或限流错误时冷却该账号并切换到下一个；运行与数据集的后续读取
+    按 ``account`` 回到所属账号；未传 ``account`` 时按最近运行的ID查找
+    （只保留最近 ``MAX_ROUTES`` 条，更早的运行需传入任务记录中的账号）。
+    """
     
     def __init__(self):
         self._client: Optional[ApifyClient] = None
+        self._slots: List[TokenSlot] = []
+        self._routes: "OrderedDict[str, str]" = OrderedDict()
+        # 配置中移除的账号，进行中的运行及其数据集仍通过它访问
+        self._retired: Dict[str, TokenSlot] = {}
+        self._lock = threading.Lock()
         self._initialize_client()
+        config_manager.subscribe(self._on_config_change)
+    
+    def _on_config_change(self, changes: Dict[str, Any]):
+        """Apify配置变更时刷新账号池（已有账号的运行计数和冷却状态保留）"""
+        if any(key.startswith("apify.") for key in changes):
+            self._initialize_client()
     
     def _initialize_client(self):
         """初始化Apify客户端"""
@@ -47,8 +112,27 @@ class ApifyDataClient:
         
         try:
             apify_config = config_manager.apify
-            self._client = ApifyClient(apify_config.api_token)
-            logger.info("Apify客户端初始化成功")
+            with self._lock:
+                # 已有账号保留运行计数和冷却状态，客户端由工厂按Token复用
+                existing = {slot.account: slot for slot in self._slots}
+                slots = []
+                for token in apify_config.token_pool:
+                    slot = TokenSlot(token, client_factory.apify_client(token))
+                    previous = existing.get(slot.account)
+                    if not previous:
+                        previous = self._retired.pop(slot.account, None)
+                    if previous:
+                        previous.client = slot.client
+                        slot = previous
+                    slots.append(slot)
+                
+                accounts = {slot.account for slot in slots}
+                for account, slot in existing.items():
+                    if account not in accounts:
+                        self._retired[account] = slot
+                self._slots = slots
+                self._client = slots[0].client
+            logger.info(f"Apify客户端初始化成功, 账号数量: {len(slots)}")
         except Exception as e:
             logger.error(f"Apify客户端初始化失败: {e}")
     
@@ -56,6 +140,65 @@ class ApifyDataClient:
         """检查客户端是否就绪"""
         return self._client is not None
     
+    def pool_status(self) -> List[Dict[str, Any]]:
+        """获取Token池状态"""
+        with self._lock:
+            return [slot.to_dict() for slot in self._slots]
+    
+    def _acquire_slot(self, exclude: set) -> Optional[TokenSlot]:
+        """选择并占用负载最低的可用账号"""
+        max_runs = config_manager.apify.max_runs_per_token if config_manager.apify else 0
+        now = time.time()
+        with self._lock:
+            candidates = [slot for slot in self._slots if slot.account not in exclude]
+            available = [slot for slot in candidates if not slot.is_cooling(now)]
+            if max_runs:
+                available = [slot for slot in available if slot.active_runs < max_runs] or available
+            if not available:
+                # 全部冷却中时仍选择最早恢复的账号，由API决定是否接受
+                available = sorted(candidates, key=lambda x: x.cooldown_until)[:1]
+            if not available:
+                return None
+            
+            slot = min(available, key=lambda x: (x.active_runs, x.total_runs))
+            slot.active_runs += 1
+            slot.total_runs += 1
+            return slot
+    
+    def _release_slot(self, slot: TokenSlot, quota_error: bool = False):
+        """释放账号，配额错误时进入冷却"""
+        cooldown = config_manager.apify.token_cooldown if config_manager.apify else 60
+        with self._lock:
+            slot.active_runs -= 1
+            if quota_error:
+                slot.failures += 1
+                slot.cooldown_until = time.time() + cooldown
+    
+    def _client_for(self, *keys: Optional[str], account: Optional[str] = None) -> ApifyClient:
+        """按账号或运行/数据集ID找到所属客户端，找不到时使用主客户端"""
+        with self._lock:
+            if not account:
+                key = next((key for key in keys if key in self._routes), None)
+                if key:
+                    self._routes.move_to_end(key)
+                    account = self._routes[key]
+            if account:
+                for slot in self._slots:
+                    if slot.account == account:
+                        return slot.client
+                if account in self._retired:
+                    return self._retired[account].client
+        return self._client
+    
+    def _remember_route(self, account: str, *keys: Optional[str]):
+        with self._lock:
+            for key in keys:
+                if key:
+                    self._routes[key] = account
+                    self._routes.move_to_end(key)
+            while len(self._routes) > MAX_ROUTES:
+                self._routes.popitem(last=False)
+    
     def test_connection(self) -> bool:
         """测试连接"""
         if not self.is_ready():
@@ -91,51 +234,74 @@ class ApifyDataClient:
             logger.error("客户端未初始化")
             return None
         
-        try:
-            logger.info(f"开始运行Actor: {actor_id}")
-            run = self._client.actor(actor_id).call(run_input=run_input or {})
-            
-            actor_run = ActorRun(
-                id=run['id'],
-                status=run['status'],
-                started_at=run.get('startedAt'),
-                finished_at=run.get('finishedAt'),
-                stats=run.get('stats'),
-                output=run.get('output')
-            )
+        tried = set()
+        while True:
+            slot = self._acquire_slot(tried)
+            if not slot:
+                logger.error("没有可用的Apify账号")
+                return None
+            tried.add(slot.account)
             
-            logger.info(f"Actor运行完成: {actor_run.id}, 状态: {actor_run.status}")
-            return actor_run
-            
-        except Exception as e:
-            logger.error(f"运行Actor失败: {e}")
-            return None
+            quota_error = False
+            try:
+                logger.info(f"开始运行Actor: {actor_id}, 账号: {slot.account}")
+                run = slot.client.actor(actor_id).call(run_input=run_input or {})
+                
+                actor_run = ActorRun(
+                    id=run['id'],
+                    status=run['status'],
+                    started_at=run.get('startedAt'),
+                    finished_at=run.get('finishedAt'),
+                    stats=run.get('stats'),
+                    output=run.get('output'),
+                    default_dataset_id=run.get('defaultDatasetId'),
+                    account=slot.account
+                )
+                self._remember_route(
+                    slot.account, actor_run.id, actor_run.default_dataset_id,
+                    (actor_run.output or {}).get('datasetId')
+                )
+                
+                logger.info(f"Actor运行完成: {actor_run.id}, 状态: {actor_run.status}")
+                return actor_run
+                
+            except Exception as e:
+                quota_error = _is_quota_error(e)
+                if quota_error and len(tried) < len(self._slots):
+                    logger.warning(f"账号 {slot.account} 配额不足或被限流，切换账号重试: {e}")
+                    continue
+                logger.error(f"运行Actor失败: {e}")
+                return None
+            finally:
+                self._release_slot(slot, quota_error)
     
-    def get_run_status(self, run_id: str) -> Optional[str]:
+    def get_run_status(self, run_id: str, account: Optional[str] = None) -> Optional[str]:
         """获取运行状态"""
         if not self.is_ready():
             logger.error("客户端未初始化")
             return None
         
         try:
-            run = self._client.run(run_id).get()
+            run = self._client_for(run_id, account=account).run(run_id).get()
             return run.get('status')
         except Exception as e:
             logger.error(f"获取运行状态失败: {e}")
             return None
     
-    def get_dataset_items(self, dataset_id: str, limit: int = 100) -> List[DatasetItem]:
+    def get_dataset_items(self, dataset_id: str, limit: int = 100,
+                          account: Optional[str] = None) -> List[DatasetItem]:
         """获取数据集项目"""
         if not self.is_ready():
             logger.error("客户端未初始化")
             return []
         
         try:
-            dataset = self._client.dataset(dataset_id)
-            items = dataset.list_items(limit=limit)
+            dataset = self._client_for(dataset_id, account=account).dataset(dataset_id)
+            items = self._fetch_items(dataset, offset=0, limit=limit)
             
+            # 数据来自API已是dict，跳过逐项校验
             dataset_items = [
-                DatasetItem(data=item) for item in items.items
+                DatasetItem.model_construct(data=item) for item in items
             ]
             
             logger.info(f"获取到 {len(dataset_items)} 个数据项")
@@ -145,14 +311,42 @@ class ApifyDataClient:
             logger.error(f"获取数据集项目失败: {e}")
             return []
     
-    def download_dataset(self, dataset_id: str, format: str = "json") -> Optional[bytes]:
+    def iterate_dataset_items(self, dataset_id: str, page_size: int = 1000,
+                              limit: Optional[int] = None,
+                              account: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """分页迭代数据集项目，一次只在内存中保留一页"""
+        if not self.is_ready():
+            logger.error("客户端未初始化")
+            return
+
+        dataset = self._client_for(dataset_id, account=account).dataset(dataset_id)
+        offset = 0
+        while limit is None or offset < limit:
+            page_limit = page_size if limit is None else min(page_size, limit - offset)
+            items = self._fetch_items(dataset, offset=offset, limit=page_limit)
+            if not items:
+                return
+
+            yield from items
+            offset += len(items)
+            if len(items) < page_limit:
+                return
+
+    @staticmethod
+    def _fetch_items(dataset, offset: int, limit: Optional[int]) -> List[Dict[str, Any]]:
+        """获取原始响应字节并直接用快速编解码器解析"""
+        data = dataset.get_items_as_bytes(item_format="json", offset=offset, limit=limit)
+        return serialization.loads(data)
+
+    def download_dataset(self, dataset_id: str, format: str = "json",
+                         account: Optional[str] = None) -> Optional[bytes]:
         """下载数据集"""
         if not self.is_ready():
             logger.error("客户端未初始化")
             return None
         
         try:
-            dataset = self._client.dataset(dataset_id)
+            dataset = self._client_for(dataset_id, account=account).dataset(dataset_id)
             data = dataset.download_items(item_format=format)
             
             logger.info(f"数据集下载成功，格式: {format}")
@@ -0,0 +1,251 @@
+"""商品变更检测模块
+
+维护每个商品的最新状态索引（``data_dir/product_state``），新一轮爬取结果
+流入时与索引比对并产生价格、库存、销量、标题的变更事件。
+
+索引由快照 ``latest.json`` 和追加日志 ``journal.jsonl`` 组成：每次更新只追加
+发生变化的商品，成本与本轮爬取量成正比；日志超过阈值时再合并回快照。
+"""
+
+import math
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+from pydantic import BaseModel, Field
+
+from .config import config_manager
+from . import serialization
+from .locking import file_lock
+from .fields import column_paths, lookup, to_float
+
+# 商品ID候选字段，与列式存储共用同一份定义
+PRODUCT_ID_PATHS = column_paths("product_id")
+
+# 监控字段: (字段名, 候选路径, 是否数值)
+TRACKED_FIELDS = [
+    ("price", column_paths("price"), True),
+    ("stock", ["stock", "stock_count", "inventory", "available_stock", "quantity"], True),
+    ("sold_count", column_paths("sold_count"), True),
+    ("title", ["title", "name", "product_name", "product.title"], False),
+]
+
+
+class ChangeEvent(BaseModel):
+    """商品变更事件"""
+
+    product_id: str = Field(..., description="商品ID")
+    field: str = Field(..., description="变更字段")
+    old_value: Any = Field(default=None, description="旧值")
+    new_value: Any = Field(default=None, description="新值")
+    task_id: Optional[str] = Field(default=None, description="来源任务ID")
+    detected_at: datetime = Field(default_factory=datetime.now)
+
+
+class ProductChangeTracker:
+    """商品最新状态索引与变更检测"""
+
+    def __init__(self, state_dir: Optional[str] = None, compact_threshold: int = 100000):
+        self._state_dir = Path(state_dir or Path(config_manager.app.data_dir) / "product_state")
+        self._snapshot_file = self._state_dir / "latest.json"
+        self._journal_file = self._state_dir / "journal.jsonl"
+        # 多个进程可能同时追加日志，追加、读取与合并快照都持有该文件锁
+        self._lock_file = self._state_dir / "journal.lock"
+        self._history_dir = self._state_dir / "history"
+        self._history_dir.mkdir(parents=True, exist_ok=True)
+
+        self.compact_threshold = compact_threshold
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._journal_lines = 0
+        self._listeners: List[Callable[[ChangeEvent], None]] = []
+        self._lock = threading.Lock()
+        self._load_state()
+
+    def _load_state(self):
+        """加载快照并重放追加日志"""
+        try:
+            with file_lock(self._lock_file):
+                self._states, self._journal_lines = self._read_disk_state()
+            logger.info(f"加载了 {len(self._states)} 个商品状态")
+
+        except Exception as e:
+            logger.error(f"加载商品状态失败: {e}")
+
+    def _read_disk_state(self) -> Tuple[Dict[str, Dict[str, Any]], int]:
+        """读取快照并重放追加日志，返回 (商品状态, 日志行数)（调用方需持有文件锁）"""
+        states: Dict[str, Dict[str, Any]] = {}
+        lines = 0
+        if self._snapshot_file.exists():
+            states = serialization.load_file(self._snapshot_file)
+
+        if self._journal_file.exists():
+            with open(self._journal_file, 'rb') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = serialization.loads(line)
+                    except Exception:
+                        # 上次写入中断留下的半行
+                        continue
+                    states[entry["id"]] = entry["state"]
+                    lines += 1
+        return states, lines
+
+    def on_change(self, listener: Callable[[ChangeEvent], None]):
+        """注册变更事件监听器"""
+        self._listeners.append(listener)
+
+    def get_state(self, product_id: str) -> Optional[Dict[str, Any]]:
+        """获取商品最新状态"""
+        state = self._states.get(str(product_id))
+        return dict(state) if state else None
+
+    @property
+    def product_count(self) -> int:
+        """已索引商品数量"""
+        return len(self._states)
+
+    @staticmethod
+    def _extract_id(item: Dict[str, Any]) -> Optional[str]:
+        """提取商品ID"""
+        for path in PRODUCT_ID_PATHS:
+            value = lookup(item, path)
+            if value not in (None, ""):
+                return str(value)
+        return None
+
+    @staticmethod
+    def _extract_fields(item: Dict[str, Any]) -> Dict[str, Any]:
+        """提取监控字段，缺失的字段不返回"""
+        fields = {}
+        for name, paths, numeric in TRACKED_FIELDS:
+            for path in paths:
+                value = lookup(item, path)
+                if value in (None, ""):
+                    continue
+                if numeric:
+                    value = to_float(value)
+                    if math.isnan(value):
+                        continue
+                else:
+                    value = str(value).strip()
+                fields[name] = value
+                break
+        return fields
+
+    def update(self, items: Iterable[Dict[str, Any]],
+               task_id: Optional[str] = None) -> List[ChangeEvent]:
+        """用新一轮结果更新索引，返回变更事件
+
+        首次出现的商品只建立索引，不产生事件；本轮未出现的商品保持原状态。
+        """
+        now = datetime.now()
+        events: List[ChangeEvent] = []
+        journal: List[bytes] = []
+
+        with self._lock:
+            for item in items:
+                product_id = self._extract_id(item)
+                if not product_id:
+                    continue
+
+                fields = self._extract_fields(item)
+                previous = self._states.get(product_id)
+                state = dict(previous) if previous else {"first_seen": now.isoformat()}
+
+                changed = previous is None
+                for name, value in fields.items():
+                    old_value = state.get(name)
+                    if previous is not None and name in previous and old_value != value:
+                        events.append(ChangeEvent(
+                            product_id=product_id, field=name,
+                            old_value=old_value, new_value=value,
+                            task_id=task_id, detected_at=now
+                        ))
+                    if old_value != value:
+                        state[name] = value
+                        changed = True
+
+                state["last_seen"] = now.isoformat()
+                state["last_task_id"] = task_id
+                self._states[product_id] = state
+                # 只有字段变化或新商品才写日志，last_seen在合并快照时落盘
+                if changed:
+                    journal.append(serialization.dumps({"id": product_id, "state": state}))
+
+            if journal:
+                with file_lock(self._lock_file):
+                    with open(self._journal_file, 'ab') as f:
+                        f.write(b"\n".join(journal) + b"\n")
+                self._journal_lines += len(journal)
+
+            if events:
+                self._append_history(events)
+
+            if self._journal_lines >= self.compact_threshold:
+                self._compact()
+
+        for event in events:
+            for listener in self._listeners:
+                try:
+                    listener(event)
+                except Exception as e:
+                    logger.error(f"变更事件处理失败: {e}")
+
+        logger.info(f"商品状态已更新: 变更 {len(events)} 项, 任务: {task_id}")
+        return events
+
+    def _append_history(self, events: List[ChangeEvent]):
+        """按月追加变更历史（调用方需持有锁）"""
+        history_file = self._history_dir / f"{events[0].detected_at:%Y-%m}.jsonl"
+        with open(history_file, 'ab') as f:
+            for event in events:
+                f.write(serialization.dumps(event.dict()) + b"\n")
+
+    def compact(self):
+        """将追加日志合并到快照"""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        """合并快照（调用方需持有锁）
+
+        在文件锁内重新读取磁盘上的快照和日志，包含其他进程追加的记录；
+        同一商品以最近一次看到的状态为准（本进程只在内存中更新的last_seen也随之落盘）。
+        """
+        with file_lock(self._lock_file):
+            states, _ = self._read_disk_state()
+            for product_id, state in self._states.items():
+                current = states.get(product_id)
+                if current is None or state.get("last_seen", "") >= current.get("last_seen", ""):
+                    states[product_id] = state
+            serialization.dump_file(states, self._snapshot_file, atomic=True)
+            self._journal_file.unlink(missing_ok=True)
+        self._states = states
+        self._journal_lines = 0
+        logger.info(f"商品状态快照已合并: {len(self._states)} 个商品")
+
+    def history(self, product_id: Optional[str] = None, field: Optional[str] = None,
+                since: Optional[datetime] = None) -> List[ChangeEvent]:
+        """查询变更历史"""
+        events = []
+        for history_file in sorted(self._history_dir.glob("*.jsonl")):
+            if since and history_file.stem < f"{since:%Y-%m}":
+                continue
+            with open(history_file, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    event = ChangeEvent(**serialization.loads(line))
+                    if product_id and event.product_id != str(product_id):
+                        continue
+                    if field and event.field != field:
+                        continue
+                    if since and event.detected_at < since:
+                        continue
+                    events.append(event)
+        return events
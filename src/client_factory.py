@@ -0,0 +1,173 @@
+"""客户端工厂模块
+
+统一创建Apify客户端和通用HTTP会话，所有代码路径共享同一个keep-alive连接池，
+批量分页读取数据集时复用TCP/TLS连接，避免重复握手。
+"""
+
+import threading
+from typing import Dict, Optional, Tuple
+
+import requests
+from apify_client import ApifyClient
+from loguru import logger
+from requests.adapters import HTTPAdapter
+
+from .config import config_manager
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - apify-client 1.x依赖httpx
+    httpx = None
+
+# apify-client按接口为每个请求设置超时（元数据等小请求5秒起，重试时翻倍），
+# 客户端超时是这些超时的上限，也是数据集导出、等待运行结束等未指定超时的请求的读取超时，
+# 因此保持不低于库默认的360秒，配置的超时只用于建立连接
+_APIFY_CLIENT_TIMEOUT_SECS = 360
+
+_DEFAULT_HEADERS = {"Accept-Encoding": "gzip"}
+
+
+class _TimeoutHTTPAdapter(HTTPAdapter):
+    """未显式指定timeout的请求使用默认超时"""
+
+    def __init__(self, timeout: int, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=timeout or self.timeout, **kwargs)
+
+
+def _connect_timeout_hook(timeout: int):
+    """httpx请求钩子：连接和等待连接池的超时不超过配置的超时，读写超时保持apify-client的设置"""
+    def hook(request):
+        limits = dict(request.extensions.get("timeout") or {})
+        for phase in ("connect", "pool"):
+            if limits.get(phase) is None or limits[phase] > timeout:
+                limits[phase] = timeout
+        request.extensions["timeout"] = limits
+    return hook
+
+
+class ClientFactory:
+    """共享客户端工厂
+
+    - ``apify_client(token)``: 按Token缓存ApifyClient，所有Token共用一个httpx连接池
+    - ``http_session()``: 共享的requests会话（媒体下载等非Apify请求）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._apify_clients: Dict[str, Tuple[Tuple, ApifyClient]] = {}
+        self._transport = None
+        self._transport_key: Optional[Tuple] = None
+        self._session: Optional[requests.Session] = None
+        config_manager.subscribe(self._on_config_change)
+
+    @staticmethod
+    def _settings() -> Tuple[int, int, int, int]:
+        """当前连接设置: (超时, 重试次数, 连接池大小, keep-alive秒数)"""
+        apify_config = config_manager.apify
+        if apify_config is None:
+            return 30, 3, 50, 30
+        return (apify_config.timeout, apify_config.max_retries,
+                apify_config.http_pool_size, apify_config.http_keepalive_expiry)
+
+    def _shared_transport(self, pool_size: int, keepalive: int):
+        """获取共享的httpx连接池（调用方需持有锁）"""
+        key = (pool_size, keepalive)
+        if self._transport is None or self._transport_key != key:
+            # 旧连接池仍可能被进行中的请求使用，不主动关闭，由GC回收
+            self._transport = httpx.HTTPTransport(limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=keepalive
+            ))
+            self._transport_key = key
+        return self._transport
+
+    def apify_client(self, token: str) -> ApifyClient:
+        """获取Token对应的ApifyClient，设置未变化时复用已有实例"""
+        timeout, max_retries, pool_size, keepalive = self._settings()
+        key = (timeout, max_retries, pool_size, keepalive)
+
+        with self._lock:
+            cached = self._apify_clients.get(token)
+            if cached and cached[0] == key:
+                return cached[1]
+
+            client = ApifyClient(
+                token,
+                max_retries=max_retries,
+                timeout_secs=max(timeout, _APIFY_CLIENT_TIMEOUT_SECS)
+            )
+            self._tune_apify_client(client, pool_size, keepalive, timeout)
+            self._apify_clients[token] = (key, client)
+
+        logger.debug(f"创建Apify客户端, 连接池: {pool_size}, 超时: {timeout}s")
+        return client
+
+    def _tune_apify_client(self, client: ApifyClient, pool_size: int,
+                           keepalive: int, timeout: int):
+        """替换ApifyClient内部的httpx客户端以使用共享连接池（调用方需持有锁）"""
+        http_client = getattr(client, "http_client", None)
+        original = getattr(http_client, "httpx_client", None)
+        if httpx is None or original is None:
+            logger.debug("当前apify-client版本不支持替换连接池，使用默认设置")
+            return
+
+        headers = httpx.Headers(original.headers)
+        headers.update(_DEFAULT_HEADERS)
+        http_client.httpx_client = httpx.Client(
+            headers=headers,
+            follow_redirects=True,
+            timeout=max(timeout, _APIFY_CLIENT_TIMEOUT_SECS),
+            # 逐请求超时由apify-client写入request.extensions，在发送前限制其连接阶段
+            event_hooks={"request": [_connect_timeout_hook(timeout)]},
+            transport=self._shared_transport(pool_size, keepalive)
+        )
+        original.close()
+
+    def _on_config_change(self, changes: Dict[str, tuple]):
+        """连接设置变更后，新请求使用新的会话；ApifyClient在下次获取时按新设置重建"""
+        keys = {"apify.timeout", "apify.max_retries", "apify.http_pool_size", "apify.http_keepalive_expiry"}
+        if keys & set(changes):
+            with self._lock:
+                # 旧会话可能仍被进行中的下载使用，不主动关闭
+                self._session = None
+
+    def http_session(self) -> requests.Session:
+        """获取共享的requests会话"""
+        with self._lock:
+            if self._session is None:
+                timeout, max_retries, pool_size, _ = self._settings()
+                session = requests.Session()
+                session.headers.update(_DEFAULT_HEADERS)
+                adapter = _TimeoutHTTPAdapter(
+                    timeout=timeout,
+                    pool_connections=pool_size,
+                    pool_maxsize=pool_size,
+                    max_retries=max_retries
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+            return self._session
+
+    def close(self):
+        """关闭所有连接"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+            for _, client in self._apify_clients.values():
+                httpx_client = getattr(getattr(client, "http_client", None), "httpx_client", None)
+                if httpx_client is not None:
+                    httpx_client.close()
+            self._apify_clients.clear()
+            self._transport = None
+            self._transport_key = None
+
+
+# 全局客户端工厂实例
+client_factory = ClientFactory()
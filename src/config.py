@@ -1,17 +1,32 @@
 """配置管理模块
 
 负责管理Apify API配置、环境变量和应用设置。
+
+配置支持热加载：``reload()`` 重新读取 ``.env`` 文件与环境变量，校验通过后整体替换，
+再把变更的字段（如 ``app.log_level``、``apify.api_tokens``）通知订阅者；
+``start_watching()`` 在后台轮询文件修改时间并自动调用 ``reload()``。
 """
 
 import os
-from typing import Optional
-from pydantic import BaseModel, Field
-from dotenv import load_dotenv
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from dotenv import dotenv_values, find_dotenv, load_dotenv
 from loguru import logger
 
+# 进程启动时的环境变量优先于配置文件，热加载时不会被文件覆盖
+_PROCESS_ENV = dict(os.environ)
+
 # 加载环境变量
 load_dotenv()
 
+# 配置变更: {"app.log_level": (旧值, 新值), ...}
+ConfigChanges = Dict[str, Tuple[Any, Any]]
+
+# loguru内置的日志级别
+LOG_LEVELS = ("TRACE", "DEBUG", "INFO", "SUCCESS", "WARNING", "ERROR", "CRITICAL")
+
 
 class ApifyConfig(BaseModel):
     """Apify配置模型"""
@@ -20,9 +35,27 @@ class ApifyConfig(BaseModel):
     base_url: str = Field(default="https://api.apify.com/v2", description="Apify API基础URL")
     timeout: int = Field(default=30, description="请求超时时间(秒)")
     max_retries: int = Field(default=3, description="最大重试次数")
+    api_tokens: List[str] = Field(default_factory=list, description="额外的API Token（多账号轮换）")
+    max_runs_per_token: int = Field(default=25, description="单个Token的最大并发运行数")
+    token_cooldown: int = Field(default=60, description="Token触发配额/限流后的冷却时间(秒)")
+    http_pool_size: int = Field(default=50, description="HTTP连接池大小")
+    http_keepalive_expiry: int = Field(default=30, description="空闲连接保持时间(秒)")
     
     class Config:
         env_prefix = "APIFY_"
+    
+    @field_validator("api_tokens", mode="before")
+    @classmethod
+    def _split_tokens(cls, value):
+        """环境变量中以逗号分隔多个Token"""
+        if isinstance(value, str):
+            return [token.strip() for token in value.split(",") if token.strip()]
+        return value
+    
+    @property
+    def token_pool(self) -> List[str]:
+        """去重后的全部Token，主Token在前"""
+        return list(dict.fromkeys([self.api_token, *self.api_tokens]))
 
 
 class AppConfig(BaseModel):
@@ -31,37 +64,235 @@ class AppConfig(BaseModel):
     debug: bool = Field(default=False, description="调试模式")
     log_level: str = Field(default="INFO", description="日志级别")
     data_dir: str = Field(default="./data", description="数据存储目录")
+    profile_enabled: bool = Field(default=False, description="是否启用任务性能剖析")
+    profile_cpu: bool = Field(default=True, description="剖析时是否采集cProfile调用统计")
+    profile_memory: bool = Field(default=False, description="剖析时是否采集tracemalloc内存快照")
+    profile_top: int = Field(default=30, description="内存报告保留的条目数")
+    json_codec: str = Field(default="auto", description="JSON编解码器: auto/orjson/msgspec/stdlib")
+    summary_preview_size: int = Field(default=10, description="任务结果预览保存的条数")
+    scheduler_workers: int = Field(default=4, description="调度器并发运行的任务数")
+    config_reload_interval: float = Field(default=2.0, description="配置文件轮询间隔(秒)")
     
     class Config:
         env_prefix = "APP_"
+    
+    @field_validator("log_level")
+    @classmethod
+    def _check_log_level(cls, value: str) -> str:
+        """日志级别不区分大小写，未知级别校验失败（热加载时保留当前配置）"""
+        level = value.strip().upper()
+        if level not in LOG_LEVELS:
+            raise ValueError(f"未知的日志级别: {value}，可选: {', '.join(LOG_LEVELS)}")
+        return level
+
+
+def _env_values(model: type, prefix: str, environ: Mapping[str, str] = os.environ) -> dict:
+    """按字段名读取带前缀的环境变量（BaseModel本身不读取环境变量）"""
+    values = {}
+    for name in model.model_fields:
+        value = environ.get(f"{prefix}{name.upper()}")
+        if value is not None:
+            values[name] = value
+    return values
+
+
+def _diff(prefix: str, old: Optional[BaseModel], new: Optional[BaseModel]) -> ConfigChanges:
+    """比较两份配置，返回变更的字段"""
+    old_values = old.dict() if old is not None else {}
+    new_values = new.dict() if new is not None else {}
+    changes = {}
+    for name in set(old_values) | set(new_values):
+        if old_values.get(name) != new_values.get(name):
+            changes[f"{prefix}.{name}"] = (old_values.get(name), new_values.get(name))
+    return changes
 
 
 class ConfigManager:
     """配置管理器"""
     
-    def __init__(self):
+    def __init__(self, env_files: Optional[List[str]] = None):
         self._apify_config: Optional[ApifyConfig] = None
         self._app_config: Optional[AppConfig] = None
+        self._lock = threading.RLock()
+        self._subscribers: List[Callable[[ConfigChanges], None]] = []
+        # 通过代码设置的值（如set_apify_token），热加载时保留
+        self._overrides: Dict[str, Any] = {}
+        if env_files is None:
+            env_files = [path for path in os.getenv("APP_CONFIG_FILES", "").split(",") if path]
+        self._env_files = [Path(path) for path in env_files or [find_dotenv() or ".env"]]
+        for path in self._env_files:
+            load_dotenv(path)
+        self._file_keys = set(self._read_files())
+        self._file_state = self._stat_files()
+        self._watcher: Optional[threading.Thread] = None
+        self._watch_stop = threading.Event()
         self._load_configs()
     
+    def _build_configs(self, environ: Mapping[str, str]) -> Tuple[AppConfig, Optional[ApifyConfig]]:
+        """从环境变量构建配置，校验失败时抛出异常"""
+        return AppConfig(**_env_values(AppConfig, "APP_", environ)), self._build_apify_config(environ)
+    
+    def _build_apify_config(self, environ: Mapping[str, str]) -> Optional[ApifyConfig]:
+        """构建Apify配置，未配置Token时返回None，校验失败时抛出异常"""
+        apify_values = _env_values(ApifyConfig, "APIFY_", environ)
+        apify_values.update(self._overrides)
+        if not apify_values.get("api_token") and apify_values.get("api_tokens"):
+            # 只配置了APIFY_API_TOKENS时以第一个作为主Token
+            tokens = ApifyConfig._split_tokens(apify_values["api_tokens"])
+            if tokens:
+                apify_values["api_token"] = tokens[0]
+        
+        if not apify_values.get("api_token"):
+            return None
+        return ApifyConfig(**apify_values)
+    
     def _load_configs(self):
-        """加载配置"""
+        """加载配置（应用配置与Apify配置分别校验，一方无效不影响另一方）"""
+        app_values = _env_values(AppConfig, "APP_")
         try:
-            # 加载应用配置
-            self._app_config = AppConfig()
+            self._app_config = AppConfig(**app_values)
             logger.info("应用配置加载成功")
+        except ValidationError as e:
+            # 启动时没有可保留的配置，无效字段使用默认值，其余字段照常生效
+            for error in e.errors():
+                name = error["loc"][0] if error["loc"] else None
+                if name in app_values:
+                    logger.error(f"APP_{str(name).upper()}无效，使用默认值: "
+                                 f"{app_values.pop(name)!r}, 错误: {error['msg']}")
+            self._app_config = AppConfig(**app_values)
+        
+        try:
+            self._apify_config = self._build_apify_config(os.environ)
+        except Exception as e:
+            logger.error(f"Apify配置加载失败: {e}")
+            return
+        
+        if self._apify_config is None:
+            logger.warning("未找到APIFY_API_TOKEN环境变量")
+            return
+        logger.info(f"Apify配置加载成功, Token数量: {len(self._apify_config.token_pool)}")
+    
+    @property
+    def env_files(self) -> List[Path]:
+        """热加载监视的配置文件"""
+        return list(self._env_files)
+    
+    def _stat_files(self) -> Dict[Path, Optional[Tuple[int, int]]]:
+        """配置文件的 (修改时间, 大小)，文件不存在时为None"""
+        state = {}
+        for path in self._env_files:
+            try:
+                stat = path.stat()
+                state[path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                state[path] = None
+        return state
+    
+    def _read_files(self) -> Dict[str, str]:
+        """读取配置文件中的值"""
+        file_values: Dict[str, str] = {}
+        for path in self._env_files:
+            if path.exists():
+                for key, value in dotenv_values(path).items():
+                    # 与load_dotenv一致，先出现的值优先
+                    if value is not None and key not in file_values:
+                        file_values[key] = value
+        return file_values
+    
+    def _read_environ(self) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """读取配置文件，返回 (合并后的环境变量, 文件中的值)"""
+        file_values = self._read_files()
+        environ = dict(os.environ)
+        for key in self._file_keys - set(file_values):
+            if key not in _PROCESS_ENV:
+                environ.pop(key, None)
+        environ.update({k: v for k, v in file_values.items() if k not in _PROCESS_ENV})
+        return environ, file_values
+    
+    def _sync_environ(self, file_values: Dict[str, str]):
+        """同步进程环境变量，供直接读取os.environ的代码使用"""
+        for key in self._file_keys - set(file_values):
+            if key not in _PROCESS_ENV:
+                os.environ.pop(key, None)
+        for key, value in file_values.items():
+            if key not in _PROCESS_ENV:
+                os.environ[key] = value
+        self._file_keys = set(file_values)
+    
+    def subscribe(self, callback: Callable[[ConfigChanges], None]) -> Callable[[ConfigChanges], None]:
+        """订阅配置变更，回调参数为变更字段字典"""
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+        return callback
+    
+    def unsubscribe(self, callback: Callable[[ConfigChanges], None]):
+        """取消订阅"""
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+    
+    def _apply(self, app_config: AppConfig, apify_config: Optional[ApifyConfig]) -> ConfigChanges:
+        """整体替换配置并通知订阅者（调用方需持有锁）"""
+        changes = _diff("app", self._app_config, app_config)
+        changes.update(_diff("apify", self._apify_config, apify_config))
+        if not changes:
+            return changes
+        
+        self._app_config = app_config
+        self._apify_config = apify_config
+        # 只记录字段名，避免Token写入日志
+        logger.info(f"配置已更新: {', '.join(sorted(changes))}")
+        
+        for callback in list(self._subscribers):
+            try:
+                callback(changes)
+            except Exception as e:
+                logger.error(f"配置变更回调失败: {getattr(callback, '__qualname__', callback)}, 错误: {e}")
+        return changes
+    
+    def reload(self) -> ConfigChanges:
+        """重新读取配置文件与环境变量，校验失败时保留当前配置"""
+        with self._lock:
+            self._file_state = self._stat_files()
+            try:
+                environ, file_values = self._read_environ()
+                app_config, apify_config = self._build_configs(environ)
+            except Exception as e:
+                logger.error(f"配置重新加载失败，保留当前配置: {e}")
+                return {}
             
-            # 加载Apify配置
-            api_token = os.getenv("APIFY_API_TOKEN")
-            if not api_token:
-                logger.warning("未找到APIFY_API_TOKEN环境变量")
-                return
-            
-            self._apify_config = ApifyConfig(api_token=api_token)
-            logger.info("Apify配置加载成功")
+            self._sync_environ(file_values)
+            return self._apply(app_config, apify_config)
+    
+    def start_watching(self, interval: Optional[float] = None) -> bool:
+        """启动后台线程，配置文件变化时自动重新加载"""
+        with self._lock:
+            if self._watcher is not None:
+                return False
             
-        except Exception as e:
-            logger.error(f"配置加载失败: {e}")
+            interval = interval or self.app.config_reload_interval
+            self._watch_stop.clear()
+            self._watcher = threading.Thread(
+                target=self._watch_loop, args=(interval,), name="config-watcher", daemon=True
+            )
+            self._watcher.start()
+        
+        logger.info(f"开始监视配置文件: {[str(path) for path in self._env_files]}")
+        return True
+    
+    def stop_watching(self):
+        """停止监视配置文件"""
+        with self._lock:
+            watcher, self._watcher = self._watcher, None
+        if watcher is not None:
+            self._watch_stop.set()
+            watcher.join()
+    
+    def _watch_loop(self, interval: float):
+        while not self._watch_stop.wait(interval):
+            if self._stat_files() != self._file_state:
+                self.reload()
     
     @property
     def apify(self) -> Optional[ApifyConfig]:
@@ -76,7 +307,16 @@ class ConfigManager:
     def set_apify_token(self, token: str) -> bool:
         """设置Apify API Token"""
         try:
-            self._apify_config = ApifyConfig(api_token=token)
+            with self._lock:
+                if self._apify_config:
+                    # 保留Token池及其他设置，只替换主Token
+                    values = self._apify_config.dict()
+                    values["api_token"] = token
+                    apify_config = ApifyConfig(**values)
+                else:
+                    apify_config = ApifyConfig(api_token=token)
+                self._overrides["api_token"] = token
+                self._apply(self.app, apify_config)
             logger.info("Apify API Token设置成功")
             return True
         except Exception as e:
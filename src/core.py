@@ -3,37 +3,68 @@
 提供高级API接口，整合配置管理、客户端和任务管理功能。
 """
 
+from contextlib import suppress
+from pathlib import Path
 from typing import Dict, List, Optional, Any
 from loguru import logger
 
 from .config import config_manager
+from . import serialization
 from .apify_service import apify_client
-from .task_manager import task_manager, Task, TaskStatus
+from .task_manager import task_manager, Task, TaskStatus, RetentionPolicy
+from .result_store import ColumnarResultStore, ResultQuery
+from .result_summary import ResultSummary
+from .change_tracker import ProductChangeTracker, ChangeEvent
 
 
 class ApifyDataIntegration:
     """Apify数据集成主类"""
     
     def __init__(self):
+        self._result_store: Optional[ColumnarResultStore] = None
+        self._change_tracker: Optional[ProductChangeTracker] = None
+        self._log_handlers: List[int] = []
         self._setup_logging()
+        config_manager.subscribe(self._on_config_change)
+    
+    def _on_config_change(self, changes: Dict[str, Any]):
+        """配置变更时更新日志级别，数据目录变更后按新目录重新打开存储"""
+        if "app.log_level" in changes:
+            self._setup_logging()
+        if "app.data_dir" in changes:
+            self._result_store = None
+            self._change_tracker = None
     
     def _setup_logging(self):
-        """设置日志"""
+        """设置日志（重复调用时只替换本类添加的处理器）
+        
+        先添加新处理器再移除旧处理器，添加失败时保留原有输出。
+        """
         log_level = config_manager.app.log_level
-        logger.remove()  # 移除默认处理器
-        logger.add(
+        file_handler = logger.add(
             "logs/app.log",
             rotation="10 MB",
             retention="7 days",
             level=log_level,
             format="{time:YYYY-MM-DD HH:mm:ss} | {level} | {name}:{function}:{line} | {message}"
         )
-        logger.add(
+        console_handler = logger.add(
             lambda msg: print(msg, end=""),
             level=log_level,
             format="<green>{time:HH:mm:ss}</green> | <level>{level}</level> | {message}"
         )
-        logger.info("日志系统初始化完成")
+        old_handlers, self._log_handlers = self._log_handlers, [file_handler, console_handler]
+        if old_handlers:
+            for handler_id in old_handlers:
+                logger.remove(handler_id)
+        else:
+            with suppress(ValueError):
+                logger.remove(0)  # 移除默认处理器
+        logger.info(f"日志系统初始化完成, 级别: {log_level}")
+    
+    def reload_config(self) -> List[str]:
+        """重新加载配置并推送给各组件，返回变更的字段名（无需重新setup）"""
+        return sorted(config_manager.reload())
     
     def setup(self, api_token: str = None) -> Dict[str, Any]:
         """初始化设置"""
@@ -63,8 +94,9 @@ class ApifyDataIntegration:
                 result["message"] = "Apify配置未完成，请设置API Token"
                 return result
             
-            # 重新初始化客户端
-            apify_client._initialize_client()
+            # Token变更已通过配置订阅推送给客户端，这里只处理尚未初始化的情况
+            if not apify_client.is_ready():
+                apify_client._initialize_client()
             
             # 测试连接
             connection_status = apify_client.test_connection()
@@ -146,6 +178,14 @@ class ApifyDataIntegration:
         logger.info(f"获取任务结果: {task_id}")
         return task_manager.get_task_results(task_id, limit=limit)
     
+    def get_task_summary(self, task_id: str, refresh: bool = False) -> Optional[ResultSummary]:
+        """获取任务结果摘要（数量、空值率、价格分布）"""
+        return task_manager.get_task_summary(task_id, refresh=refresh)
+    
+    def get_task_preview(self, task_id: str) -> List[Dict[str, Any]]:
+        """获取任务的前N条结果预览"""
+        return task_manager.get_task_preview(task_id)
+    
     def export_task_results(self, task_id: str, format: str = "json") -> Optional[bytes]:
         """导出任务结果"""
         logger.info(f"导出任务结果: {task_id}, 格式: {format}")
@@ -161,6 +201,80 @@ class ApifyDataIntegration:
         logger.info(f"删除任务: {task_id}")
         return task_manager.delete_task(task_id)
     
+    @property
+    def result_store(self) -> ColumnarResultStore:
+        """列式结果存储（首次访问时创建）"""
+        if self._result_store is None:
+            self._result_store = ColumnarResultStore()
+        return self._result_store
+    
+    def ingest_task_results(self, task_id: str, force: bool = False) -> int:
+        """将任务结果分页写入列式存储，返回写入行数（已写入过的任务默认跳过）"""
+        task = task_manager.get_task(task_id)
+        if not task or not task.dataset_id:
+            logger.error(f"任务或数据集不存在: {task_id}")
+            return 0
+        
+        if not force and self.result_store.has_source(task.id):
+            logger.info(f"任务结果已在列式存储中: {task_id}")
+            return 0
+        
+        logger.info(f"写入任务结果到列式存储: {task_id}")
+        return self.result_store.ingest(
+            apify_client.iterate_dataset_items(task.dataset_id, account=task.account),
+            source=task.id,
+            force=force
+        )
+    
+    def ingest_saved_files(self, pattern: str = "apify_data_*.json") -> int:
+        """将已保存的JSON结果文件写入列式存储，返回写入行数（已写入过的文件跳过）"""
+        total = 0
+        for filepath in sorted(Path(config_manager.app.data_dir).glob(pattern)):
+            if self.result_store.has_source(filepath.name):
+                continue
+            try:
+                items = serialization.load_file(filepath)
+                total += self.result_store.ingest(items, source=filepath.name)
+            except Exception as e:
+                logger.error(f"写入结果文件失败: {filepath}, 错误: {e}")
+        return total
+    
+    def query_results(self) -> ResultQuery:
+        """创建列式结果查询"""
+        return self.result_store.query()
+    
+    @property
+    def change_tracker(self) -> ProductChangeTracker:
+        """商品变更检测索引（首次访问时加载）"""
+        if self._change_tracker is None:
+            self._change_tracker = ProductChangeTracker()
+        return self._change_tracker
+    
+    def track_task_changes(self, task_id: str, batch_size: int = 1000) -> List[ChangeEvent]:
+        """用任务结果更新商品状态索引，返回价格/库存/销量/标题变更事件"""
+        task = task_manager.get_task(task_id)
+        if not task or not task.dataset_id:
+            logger.error(f"任务或数据集不存在: {task_id}")
+            return []
+        
+        logger.info(f"检测任务结果变更: {task_id}")
+        events: List[ChangeEvent] = []
+        batch: List[Dict[str, Any]] = []
+        for item in apify_client.iterate_dataset_items(task.dataset_id, account=task.account):
+            batch.append(item)
+            if len(batch) >= batch_size:
+                events.extend(self.change_tracker.update(batch, task_id=task.id))
+                batch = []
+        if batch:
+            events.extend(self.change_tracker.update(batch, task_id=task.id))
+        
+        return events
+    
+    def apply_retention(self, policy: Optional[RetentionPolicy] = None) -> int:
+        """按保留策略归档历史任务"""
+        logger.info("应用任务保留策略")
+        return task_manager.apply_retention(policy)
+    
     def quick_run(self, actor_id: str, input_data: Dict[str, Any] = None,
                  task_name: str = None) -> Optional[Dict[str, Any]]:
         """快速运行Actor并获取结果"""
@@ -172,7 +286,8 @@ class ApifyDataIntegration:
             name=task_name,
             actor_id=actor_id,
             input_data=input_data,
-            description="快速运行任务"
+            description="快速运行任务",
+            tags=["quick_run"]
         )
         
         if not task:
@@ -187,15 +302,18 @@ class ApifyDataIntegration:
                 "message": "任务运行失败"
             }
         
-        # 获取结果
-        results = self.get_task_results(task.id)
+        # 运行时已累计摘要，无需再次读取数据集
+        summary = task_manager.get_task_summary(task.id)
+        if summary is None:
+            summary = ResultSummary()
         
         return {
             "success": True,
             "task_id": task.id,
-            "result_count": len(results),
-            "results": results[:10],  # 只返回前10个结果作为预览
-            "message": f"任务完成，共获取 {len(results)} 条数据"
+            "result_count": summary.item_count,
+            "results": task_manager.get_task_preview(task.id),
+            "summary": summary.dict(),
+            "message": f"任务完成，共获取 {summary.item_count} 条数据"
         }
 
 
@@ -0,0 +1,78 @@
+"""结果字段模块
+
+商品数据的字段路径与取值转换，列式存储、结果摘要和变更检测共用。不依赖numpy。
+"""
+
+import math
+from datetime import datetime
+from typing import Any, Dict, List
+
+from pydantic import BaseModel, Field
+
+
+class ColumnSpec(BaseModel):
+    """列定义"""
+
+    name: str = Field(..., description="列名")
+    kind: str = Field(default="float", description="列类型: float 或 category")
+    paths: List[str] = Field(default_factory=list, description="候选字段路径，按顺序取第一个非空值")
+
+
+# TikTok商品数据的默认列，字段路径兼容不同Actor的输出格式
+DEFAULT_COLUMNS = [
+    ColumnSpec(name="product_id", kind="category",
+               paths=["product_id", "productId", "id", "product.id"]),
+    ColumnSpec(name="shop_id", kind="category",
+               paths=["shop_id", "shopId", "seller_id", "shop.id", "shop.shop_id", "seller.id"]),
+    ColumnSpec(name="price", kind="float",
+               paths=["price", "sale_price", "salePrice", "price.min_price",
+                      "price.sale_price", "product_price", "min_price"]),
+    ColumnSpec(name="sold_count", kind="float",
+               paths=["sold_count", "soldCount", "sold", "sales", "sold_num", "total_sold"]),
+    ColumnSpec(name="timestamp", kind="float",
+               paths=["timestamp", "scraped_at", "scrapedAt", "crawled_at"]),
+    ColumnSpec(name="source", kind="category", paths=[]),
+]
+
+
+def lookup(item: Dict[str, Any], path: str) -> Any:
+    """按点号路径取值"""
+    value: Any = item
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def to_float(value: Any) -> float:
+    """将价格、销量等字段转换为浮点数，无法转换时返回NaN"""
+    if value is None or isinstance(value, bool):
+        return math.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        text = value.strip().replace(",", "").lstrip("$¥￥€£").strip()
+        multiplier = 1.0
+        if text[-1:].lower() == "k":
+            text, multiplier = text[:-1], 1e3
+        elif text[-1:].lower() == "m":
+            text, multiplier = text[:-1], 1e6
+        elif text.endswith("+"):
+            text = text[:-1]
+        try:
+            return float(text) * multiplier
+        except ValueError:
+            pass
+        try:
+            return datetime.fromisoformat(value.strip()).timestamp()
+        except ValueError:
+            return math.nan
+    return math.nan
+
+
+def column_paths(name: str) -> List[str]:
+    """默认列的候选字段路径"""
+    return next(spec.paths for spec in DEFAULT_COLUMNS if spec.name == name)
@@ -0,0 +1,382 @@
+"""商品媒体下载模块
+
+从数据集项目中提取图片/视频地址并并发下载，按内容哈希存放在
+``data_dir/media`` 下，相同资源在多次爬取之间只下载一次。
+"""
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from loguru import logger
+
+from .client_factory import client_factory
+from .config import config_manager
+from .locking import file_lock
+
+# 可识别的媒体扩展名
+MEDIA_EXTENSIONS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif", ".heic", ".bmp",
+    ".mp4", ".mov", ".webm", ".m4v", ".m3u8",
+}
+
+# 字段名中包含这些词时，其中的URL即视为媒体地址（TikTok图片CDN地址常无扩展名）
+MEDIA_KEY_HINTS = ("image", "img", "cover", "thumb", "photo", "video", "media", "picture")
+
+_CONTENT_TYPE_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "image/avif": ".avif",
+    "video/mp4": ".mp4",
+    "video/webm": ".webm",
+    "video/quicktime": ".mov",
+}
+
+_CHUNK_SIZE = 64 * 1024
+
+# 追加日志超过该行数时在download_all结束后合并进快照
+_JOURNAL_COMPACT_LINES = 10000
+
+
+def extract_media_urls(item: Any) -> List[str]:
+    """递归提取数据项中的媒体URL（保持出现顺序并去重）"""
+    urls: List[str] = []
+    seen = set()
+
+    def walk(value: Any, key: str):
+        if isinstance(value, dict):
+            for child_key, child in value.items():
+                walk(child, str(child_key).lower())
+        elif isinstance(value, (list, tuple)):
+            for child in value:
+                walk(child, key)
+        elif isinstance(value, str) and value.startswith(("http://", "https://")):
+            extension = os.path.splitext(urlparse(value).path)[1].lower()
+            if extension in MEDIA_EXTENSIONS or any(hint in key for hint in MEDIA_KEY_HINTS):
+                if value not in seen:
+                    seen.add(value)
+                    urls.append(value)
+
+    walk(item, "")
+    return urls
+
+
+class MediaBudgetExceeded(Exception):
+    """媒体下载超出大小预算"""
+
+
+class MediaDownloader:
+    """并发媒体下载器
+
+    - 默认使用共享HTTP会话，并发数为 ``max_workers``，每个主机最多 ``per_host_limit`` 个并发请求
+    - 资源以 ``sha256`` 内容寻址存放，URL到哈希的映射记录在 ``index.json`` 快照和
+      ``index.jsonl`` 追加日志中，每次下载完成只追加一行，日志较长时批量合并进快照
+    - 未完成的下载保留为 ``.part`` 文件，下次通过Range请求续传
+    """
+
+    def __init__(self, media_dir: Optional[str] = None, max_workers: int = 8,
+                 per_host_limit: int = 4, timeout: int = 30,
+                 max_file_bytes: Optional[int] = None,
+                 max_total_bytes: Optional[int] = None,
+                 session: Optional[requests.Session] = None):
+        self._media_dir = Path(media_dir or Path(config_manager.app.data_dir) / "media")
+        self._objects_dir = self._media_dir / "objects"
+        self._partial_dir = self._media_dir / "partial"
+        self._index_file = self._media_dir / "index.json"
+        self._journal_file = self._media_dir / "index.jsonl"
+        # 多个进程可能共用媒体目录，追加、读取与合并索引都持有该文件锁
+        self._lock_file = self._media_dir / "index.lock"
+        self._objects_dir.mkdir(parents=True, exist_ok=True)
+        self._partial_dir.mkdir(parents=True, exist_ok=True)
+
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.timeout = timeout
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+
+        # 未显式传入会话时每次请求从工厂获取，连接设置热加载后立即生效
+        self._own_session = session
+
+        self._lock = threading.Lock()
+        self._journal_lock = threading.Lock()
+        self._journal_lines = 0
+        self._host_limits: Dict[str, threading.Semaphore] = {}
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Dict[str, threading.Event] = {}
+        self._total_bytes = 0
+        self._load_index()
+
+    @property
+    def _session(self) -> requests.Session:
+        return self._own_session or client_factory.http_session()
+
+    def _load_index(self):
+        """加载URL索引（快照 + 追加日志）"""
+        try:
+            with file_lock(self._lock_file):
+                self._index, self._journal_lines = self._read_disk_index()
+
+            # 按对象去重统计已用空间
+            sizes = {entry["sha256"]: entry["size"] for entry in self._index.values()}
+            self._total_bytes = sum(sizes.values())
+            logger.info(f"加载了 {len(self._index)} 条媒体索引, 共 {self._total_bytes} 字节")
+
+        except Exception as e:
+            logger.error(f"加载媒体索引失败: {e}")
+
+    def _read_disk_index(self) -> Tuple[Dict[str, Dict[str, Any]], int]:
+        """读取快照并重放追加日志，返回 (索引, 日志行数)（调用方需持有文件锁）"""
+        index: Dict[str, Dict[str, Any]] = {}
+        lines = 0
+        if self._index_file.exists():
+            with open(self._index_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+
+        if self._journal_file.exists():
+            with open(self._journal_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 进程中断时最后一行可能不完整
+                        continue
+                    index[entry.pop("url")] = entry
+                    lines += 1
+        return index, lines
+
+    def _append_journal(self, url: str, entry: Dict[str, Any]):
+        """追加一条索引记录"""
+        line = json.dumps({"url": url, **entry}, ensure_ascii=False)
+        try:
+            with self._journal_lock, file_lock(self._lock_file):
+                with open(self._journal_file, 'a', encoding='utf-8') as f:
+                    f.write(line + "\n")
+                self._journal_lines += 1
+        except Exception as e:
+            logger.error(f"写入媒体索引失败: {e}")
+
+    def compact_index(self):
+        """将追加日志合并进 ``index.json`` 快照
+
+        在文件锁内重新读取磁盘上的快照和日志，其他进程追加的记录一并合并。
+        """
+        try:
+            with self._journal_lock, file_lock(self._lock_file):
+                index, _ = self._read_disk_index()
+                with self._lock:
+                    index.update(self._index)
+                    self._index.update(index)
+                temp_file = self._index_file.with_suffix(".tmp")
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(index, f, ensure_ascii=False)
+                os.replace(temp_file, self._index_file)
+                self._journal_file.unlink(missing_ok=True)
+                self._journal_lines = 0
+            logger.info(f"媒体索引已合并: {len(index)} 条")
+        except Exception as e:
+            logger.error(f"合并媒体索引失败: {e}")
+
+    def _host_semaphore(self, url: str) -> threading.Semaphore:
+        """获取主机级并发限制"""
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.Semaphore(self.per_host_limit)
+            return self._host_limits[host]
+
+    def get_path(self, url: str) -> Optional[Path]:
+        """获取已缓存资源的本地路径"""
+        entry = self._index.get(url)
+        if not entry:
+            return None
+        path = self._media_dir / entry["path"]
+        return path if path.exists() else None
+
+    @property
+    def total_bytes(self) -> int:
+        """已缓存资源总大小"""
+        return self._total_bytes
+
+    def download(self, url: str) -> Optional[Path]:
+        """下载单个资源，已缓存时直接返回本地路径"""
+        cached = self.get_path(url)
+        if cached:
+            return cached
+
+        # 同一URL并发请求时只下载一次
+        with self._lock:
+            event = self._inflight.get(url)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self._inflight[url] = event
+
+        if not owner:
+            event.wait()
+            return self.get_path(url)
+
+        try:
+            with self._host_semaphore(url):
+                return self._fetch(url)
+        except MediaBudgetExceeded as e:
+            logger.warning(f"媒体下载超出预算: {url}, {e}")
+            return None
+        except Exception as e:
+            logger.error(f"媒体下载失败: {url}, 错误: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._inflight.pop(url, None)
+            event.set()
+
+    def _fetch(self, url: str) -> Path:
+        """执行下载（支持断点续传）并写入内容寻址存储"""
+        url_key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        partial_file = self._partial_dir / f"{url_key}.part"
+        offset = partial_file.stat().st_size if partial_file.exists() else 0
+
+        # 媒体文件需要按原始字节续传和计算哈希，不接受传输压缩
+        headers = {"Accept-Encoding": "identity"}
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+        with self._session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code == 416:
+                # 部分文件已完整或已失效，重新下载
+                partial_file.unlink(missing_ok=True)
+                return self._fetch(url)
+            response.raise_for_status()
+
+            if offset and response.status_code != 206:
+                offset = 0  # 服务器不支持续传
+
+            content_length = response.headers.get("Content-Length")
+            size = offset
+            try:
+                if content_length:
+                    self._check_budget(offset + int(content_length))
+
+                with open(partial_file, 'ab' if offset else 'wb') as f:
+                    for chunk in response.iter_content(_CHUNK_SIZE):
+                        size += len(chunk)
+                        self._check_budget(size)
+                        f.write(chunk)
+            except MediaBudgetExceeded:
+                partial_file.unlink(missing_ok=True)
+                raise
+
+            extension = self._guess_extension(url, response.headers.get("Content-Type", ""))
+
+        digest = hashlib.sha256()
+        with open(partial_file, 'rb') as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+
+        relative_path = Path("objects") / sha256[:2] / f"{sha256}{extension}"
+        object_path = self._media_dir / relative_path
+
+        with self._lock:
+            is_new = not object_path.exists()
+            if is_new:
+                object_path.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(partial_file, object_path)
+                self._total_bytes += size
+            else:
+                partial_file.unlink(missing_ok=True)
+
+            entry = {"sha256": sha256, "path": relative_path.as_posix(), "size": size}
+            self._index[url] = entry
+
+        self._append_journal(url, entry)
+
+        logger.debug(f"媒体下载完成: {url} -> {relative_path} ({'新' if is_new else '已存在'})")
+        return object_path
+
+    def _check_budget(self, size: int):
+        """检查单文件和总空间预算"""
+        if self.max_file_bytes is not None and size > self.max_file_bytes:
+            raise MediaBudgetExceeded(f"文件大小超过 {self.max_file_bytes} 字节")
+        if self.max_total_bytes is not None and self._total_bytes + size > self.max_total_bytes:
+            raise MediaBudgetExceeded(f"缓存总大小超过 {self.max_total_bytes} 字节")
+
+    @staticmethod
+    def _guess_extension(url: str, content_type: str) -> str:
+        """根据URL或Content-Type推断扩展名"""
+        extension = os.path.splitext(urlparse(url).path)[1].lower()
+        if extension in MEDIA_EXTENSIONS:
+            return extension
+        return _CONTENT_TYPE_EXTENSIONS.get(content_type.split(";")[0].strip().lower(), "")
+
+    def download_all(self, urls: Iterable[str]) -> Dict[str, Any]:
+        """并发下载多个资源"""
+        urls = list(dict.fromkeys(urls))
+        result = {"total": len(urls), "cached": 0, "downloaded": 0, "failed": 0, "paths": {}}
+
+        pending = []
+        for url in urls:
+            path = self.get_path(url)
+            if path:
+                result["cached"] += 1
+                result["paths"][url] = str(path)
+            else:
+                pending.append(url)
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.max_workers,
+                                    thread_name_prefix="media") as executor:
+                for url, path in zip(pending, executor.map(self.download, pending)):
+                    if path:
+                        result["downloaded"] += 1
+                        result["paths"][url] = str(path)
+                    else:
+                        result["failed"] += 1
+
+        if self._journal_lines >= _JOURNAL_COMPACT_LINES:
+            self.compact_index()
+
+        logger.info(
+            f"媒体下载完成: 共 {result['total']} 个, 缓存命中 {result['cached']}, "
+            f"新下载 {result['downloaded']}, 失败 {result['failed']}"
+        )
+        return result
+
+    def download_items(self, items: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """提取并下载一批数据项中的全部媒体"""
+        urls: List[str] = []
+        for item in items:
+            urls.extend(extract_media_urls(item))
+        return self.download_all(urls)
+
+    def process_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """流水线阶段函数：下载数据项的媒体并写入 ``_media`` 字段（URL到本地相对路径）"""
+        media = {}
+        for url in extract_media_urls(item):
+            path = self.download(url)
+            if path:
+                media[url] = path.relative_to(self._media_dir).as_posix()
+
+        if media:
+            item = dict(item)
+            item["_media"] = media
+        return item
+
+    def cleanup_partial(self) -> int:
+        """清理未完成的下载文件，返回清理数量"""
+        count = 0
+        for partial_file in self._partial_dir.glob("*.part"):
+            partial_file.unlink(missing_ok=True)
+            count += 1
+        logger.info(f"清理了 {count} 个未完成的媒体文件")
+        return count
@@ -0,0 +1,363 @@
+"""结果后处理流水线模块
+
+将爬取结果按阶段（归一化、去重过滤、增强、落盘）流式处理。
+阶段之间通过有界队列连接，下游变慢时上游的 ``put`` 会阻塞，
+从而形成背压，内存占用与队列容量成正比而不是与数据量成正比。
+"""
+
+import asyncio
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from loguru import logger
+
+from . import serialization
+
+# 队列结束标记
+_STOP = object()
+
+
+class StageMode(str, Enum):
+    """阶段执行方式"""
+    THREAD = "thread"    # 线程池，适合IO密集
+    PROCESS = "process"  # 进程池，适合CPU密集（函数需可pickle）
+    ASYNC = "async"      # asyncio协程，适合大量并发网络请求
+
+
+class StageStats:
+    """阶段吞吐计数器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.received = 0
+        self.emitted = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+
+    def record(self, emitted: bool, elapsed: float, error: bool = False):
+        """记录一次处理"""
+        with self._lock:
+            self.received += 1
+            self.busy_seconds += elapsed
+            if error:
+                self.errors += 1
+            elif emitted:
+                self.emitted += 1
+            else:
+                self.dropped += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出为字典"""
+        with self._lock:
+            return {
+                "received": self.received,
+                "emitted": self.emitted,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "busy_seconds": round(self.busy_seconds, 4)
+            }
+
+
+class Stage:
+    """流水线阶段
+
+    ``func`` 接收一个数据项并返回处理后的数据项，返回 ``None`` 表示过滤掉。
+    最后一个阶段（落盘）没有下游，返回值不参与过滤，``list.append`` 之类返回
+    ``None`` 的函数也计为输出。ASYNC模式下 ``func`` 需为协程函数。
+    """
+
+    def __init__(self, name: str, func: Callable[[Any], Any], workers: int = 1,
+                 mode: StageMode = StageMode.THREAD, queue_size: int = 100):
+        if workers <= 0:
+            raise ValueError("workers必须为正数")
+
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.mode = StageMode(mode)
+        self.queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self.stats = StageStats()
+        self._alive = workers
+        self._alive_lock = threading.Lock()
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+
+    def _worker_done(self) -> bool:
+        """工作者退出，返回是否为最后一个"""
+        with self._alive_lock:
+            self._alive -= 1
+            return self._alive == 0
+
+
+class Pipeline:
+    """分阶段流式处理流水线"""
+
+    def __init__(self, stages: Sequence[Stage], name: str = "pipeline"):
+        if not stages:
+            raise ValueError("流水线至少需要一个阶段")
+
+        self.name = name
+        self._stages: List[Stage] = list(stages)
+        self._threads: List[threading.Thread] = []
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._started = False
+        self._closed = False
+        self._start_lock = threading.Lock()
+
+    def start(self) -> "Pipeline":
+        """启动所有阶段的工作者（可重复调用，只启动一次）"""
+        with self._start_lock:
+            if self._started:
+                return self
+            self._start_workers()
+            self._started = True
+
+        logger.info(f"流水线已启动: {self.name}, 阶段: {[s.name for s in self._stages]}")
+        return self
+
+    def _start_workers(self):
+        """为每个阶段创建工作者线程（调用方需持有启动锁）"""
+        self._started_at = time.perf_counter()
+
+        for index, stage in enumerate(self._stages):
+            downstream = self._stages[index + 1] if index + 1 < len(self._stages) else None
+
+            if stage.mode == StageMode.ASYNC:
+                thread = threading.Thread(
+                    target=self._run_async_stage, args=(stage, downstream),
+                    name=f"{self.name}-{stage.name}", daemon=True
+                )
+                self._threads.append(thread)
+                thread.start()
+                continue
+
+            if stage.mode == StageMode.PROCESS:
+                stage._process_pool = ProcessPoolExecutor(max_workers=stage.workers)
+
+            for worker_index in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._run_thread_worker, args=(stage, downstream),
+                    name=f"{self.name}-{stage.name}-{worker_index}", daemon=True
+                )
+                self._threads.append(thread)
+                thread.start()
+
+    def put(self, item: Any, timeout: Optional[float] = None):
+        """投递一个数据项，第一阶段队列满时阻塞（背压）"""
+        if self._closed:
+            raise RuntimeError("流水线已关闭")
+        if not self._started:
+            self.start()
+        self._stages[0].queue.put(item, timeout=timeout)
+
+    def feed(self, items: Iterable[Any]) -> int:
+        """批量投递数据项，返回投递数量"""
+        count = 0
+        for item in items:
+            self.put(item)
+            count += 1
+        return count
+
+    def close(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """停止接收数据，等待所有阶段排空并返回统计信息"""
+        if not self._started:
+            self.start()
+
+        if not self._closed:
+            self._closed = True
+            first = self._stages[0]
+            for _ in range(first.workers):
+                first.queue.put(_STOP)
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            thread.join(remaining)
+
+        for stage in self._stages:
+            if stage._process_pool:
+                stage._process_pool.shutdown()
+                stage._process_pool = None
+
+        self._finished_at = time.perf_counter()
+        stats = self.stats()
+        logger.info(f"流水线已完成: {self.name}, 耗时: {stats['elapsed_seconds']} 秒")
+        return stats
+
+    def run(self, items: Iterable[Any]) -> Dict[str, Any]:
+        """一次性处理全部数据项"""
+        self.start()
+        self.feed(items)
+        return self.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """获取各阶段吞吐统计"""
+        end = self._finished_at or time.perf_counter()
+        elapsed = end - self._started_at if self._started_at else 0.0
+
+        stages = {}
+        for stage in self._stages:
+            stage_stats = stage.stats.to_dict()
+            stage_stats["queue_depth"] = stage.queue.qsize()
+            stage_stats["workers"] = stage.workers
+            stage_stats["mode"] = stage.mode.value
+            stage_stats["items_per_second"] = (
+                round(stage_stats["received"] / elapsed, 2) if elapsed > 0 else 0.0
+            )
+            stages[stage.name] = stage_stats
+
+        return {
+            "name": self.name,
+            "elapsed_seconds": round(elapsed, 4),
+            "stages": stages
+        }
+
+    def _finish_stage(self, stage: Stage, downstream: Optional[Stage]):
+        """阶段最后一个工作者退出时通知下游"""
+        if stage._worker_done() and downstream:
+            for _ in range(downstream.workers):
+                downstream.queue.put(_STOP)
+
+    def _run_thread_worker(self, stage: Stage, downstream: Optional[Stage]):
+        """线程/进程模式的工作者"""
+        while True:
+            item = stage.queue.get()
+            if item is _STOP:
+                self._finish_stage(stage, downstream)
+                return
+
+            started = time.perf_counter()
+            try:
+                if stage._process_pool:
+                    result = stage._process_pool.submit(stage.func, item).result()
+                else:
+                    result = stage.func(item)
+            except Exception as e:
+                stage.stats.record(False, time.perf_counter() - started, error=True)
+                logger.error(f"流水线阶段处理失败: {stage.name}, 错误: {e}")
+                continue
+
+            stage.stats.record(result is not None or downstream is None,
+                               time.perf_counter() - started)
+            if result is not None and downstream:
+                downstream.queue.put(result)
+
+    def _run_async_stage(self, stage: Stage, downstream: Optional[Stage]):
+        """asyncio模式：在独立事件循环中运行 ``workers`` 个协程"""
+
+        async def worker():
+            loop = asyncio.get_running_loop()
+            while True:
+                item = await loop.run_in_executor(None, stage.queue.get)
+                if item is _STOP:
+                    return
+
+                started = time.perf_counter()
+                try:
+                    result = await stage.func(item)
+                except Exception as e:
+                    stage.stats.record(False, time.perf_counter() - started, error=True)
+                    logger.error(f"流水线阶段处理失败: {stage.name}, 错误: {e}")
+                    continue
+
+                stage.stats.record(result is not None or downstream is None,
+                                   time.perf_counter() - started)
+                if result is not None and downstream:
+                    await loop.run_in_executor(None, downstream.queue.put, result)
+
+        async def main():
+            await asyncio.gather(*(worker() for _ in range(stage.workers)))
+
+        asyncio.run(main())
+        # 协程工作者已全部退出，一次性通知下游
+        with stage._alive_lock:
+            stage._alive = 1
+        self._finish_stage(stage, downstream)
+
+
+def normalize_item(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """归一化数据项：去除字符串首尾空白并丢弃空值字段"""
+    if not isinstance(item, dict):
+        return None
+
+    normalized = {}
+    for key, value in item.items():
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == "":
+            continue
+        normalized[key] = value
+    return normalized
+
+
+class Deduplicator:
+    """按键字段去重，可作为阶段函数使用（线程安全）"""
+
+    def __init__(self, key_fields: Sequence[str] = ("id",)):
+        self.key_fields = tuple(key_fields)
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key = tuple(item.get(field) for field in self.key_fields)
+        if all(value is None for value in key):
+            # 没有键字段的数据项无法去重，直接放行
+            return item
+
+        key = json.dumps(key, ensure_ascii=False, sort_keys=True, default=str)
+        with self._lock:
+            if key in self._seen:
+                return None
+            self._seen.add(key)
+        return item
+
+
+class JsonLinesSink:
+    """以JSON Lines格式追加写入文件的落盘阶段（线程安全）"""
+
+    def __init__(self, filepath: str):
+        self.filepath = Path(filepath)
+        self.filepath.parent.mkdir(parents=True, exist_ok=True)
+        self._file = None
+        self._lock = threading.Lock()
+
+    def __call__(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        line = serialization.dumps(item)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.filepath, 'ab')
+            self._file.write(line + b"\n")
+        return item
+
+    def close(self):
+        """关闭文件"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def build_result_pipeline(sink: Callable[[Dict[str, Any]], Any],
+                          key_fields: Sequence[str] = ("id",),
+                          enrich: Optional[Callable[[Dict[str, Any]], Any]] = None,
+                          enrich_workers: int = 4,
+                          enrich_mode: StageMode = StageMode.THREAD,
+                          sink_workers: int = 1,
+                          queue_size: int = 100) -> Pipeline:
+    """构建默认的结果流水线：归一化 → 去重 → 增强(可选) → 落盘"""
+    stages = [
+        Stage("normalize", normalize_item, queue_size=queue_size),
+        Stage("dedup", Deduplicator(key_fields), queue_size=queue_size),
+    ]
+    if enrich:
+        stages.append(Stage("enrich", enrich, workers=enrich_workers,
+                            mode=enrich_mode, queue_size=queue_size))
+    stages.append(Stage("sink", sink, workers=sink_workers, queue_size=queue_size))
+    return Pipeline(stages, name="results")
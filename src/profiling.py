@@ -0,0 +1,229 @@
+"""任务性能剖析模块
+
+通过 ``APP_PROFILE_ENABLED`` 等配置开启后，对任务的各个阶段记录墙钟时间与CPU时间，
+可选采集cProfile调用统计和tracemalloc内存快照，报告写入 ``data_dir/profiles/<task_id>/``：
+
+- ``report.jsonl``: 每个阶段一行，包含墙钟时间、进程/线程CPU时间和等待时间
+- ``<section>-<n>.prof``: cProfile统计，可用 ``python -m pstats`` 或snakeviz查看
+- ``<section>-<n>.mem.txt``: 阶段前后的内存分配差异
+
+Python 3.12起cProfile基于 ``sys.monitoring``，全进程同时只能启用一个且统计包含所有线程，
+因此并发阶段中只有先开始的一个采集调用统计，其余只记录时间。
+"""
+
+import cProfile
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from loguru import logger
+
+from .config import config_manager
+
+# cProfile是否为全进程唯一（Python 3.12+）
+_SINGLE_PROFILER = sys.version_info >= (3, 12)
+
+
+class TaskProfiler:
+    """按任务和阶段记录性能数据"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._memory_users = 0
+        self._cpu_busy = False
+        self._counters: Dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        """是否启用剖析（每次读取配置，便于运行时切换）"""
+        return config_manager.app.profile_enabled
+
+    def report_dir(self, task_id: str) -> Path:
+        """任务报告目录"""
+        return Path(config_manager.app.data_dir) / "profiles" / task_id
+
+    @contextmanager
+    def profile(self, task_id: Optional[str], section: str) -> Iterator[None]:
+        """剖析一个代码段
+
+        同一线程内嵌套的阶段只记录时间，调用统计归属于最外层阶段。
+        """
+        if not task_id or not self.enabled:
+            yield
+            return
+
+        app_config = config_manager.app
+        nested = getattr(self._local, "active", False)
+        want_cpu = app_config.profile_cpu and not nested
+
+        self._local.active = True
+        profiler = None
+        memory_before = None
+        try:
+            profiler = self._start_cpu() if want_cpu else None
+            memory_before = self._start_memory() if app_config.profile_memory else None
+        except BaseException:
+            if profiler:
+                self._stop_cpu(profiler)
+            if not nested:
+                self._local.active = False
+            raise
+
+        started_at = datetime.now()
+        wall_start = time.perf_counter()
+        process_start = time.process_time()
+        thread_start = time.thread_time()
+
+        try:
+            yield
+        finally:
+            if profiler:
+                self._stop_cpu(profiler)
+            if not nested:
+                self._local.active = False
+
+            wall = time.perf_counter() - wall_start
+            thread_cpu = time.thread_time() - thread_start
+            record: Dict[str, Any] = {
+                "section": section,
+                "started_at": started_at.isoformat(),
+                "wall_seconds": round(wall, 6),
+                "thread_cpu_seconds": round(thread_cpu, 6),
+                "process_cpu_seconds": round(time.process_time() - process_start, 6),
+                # 墙钟时间中未占用本线程CPU的部分，主要是网络/IO等待
+                "wait_seconds": round(max(0.0, wall - thread_cpu), 6),
+                "nested": nested,
+            }
+            if want_cpu and profiler is None:
+                record["cpu_profile_skipped"] = True
+
+            try:
+                self._write_report(task_id, section, record, profiler, memory_before)
+            except Exception as e:
+                logger.error(f"写入剖析报告失败: {task_id}/{section}, 错误: {e}")
+            finally:
+                if memory_before is not None:
+                    self._stop_memory()
+
+    def _start_cpu(self) -> Optional[cProfile.Profile]:
+        """开始CPU调用统计，无法启用时返回None（只记录时间）"""
+        if _SINGLE_PROFILER:
+            with self._lock:
+                if self._cpu_busy:
+                    return None
+                self._cpu_busy = True
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # 其他剖析或调试工具已占用
+            logger.warning(f"无法启用CPU剖析: {e}")
+            self._release_cpu()
+            return None
+        return profiler
+
+    def _stop_cpu(self, profiler: cProfile.Profile):
+        try:
+            profiler.disable()
+        finally:
+            self._release_cpu()
+
+    def _release_cpu(self):
+        if _SINGLE_PROFILER:
+            with self._lock:
+                self._cpu_busy = False
+
+    def _start_memory(self) -> Optional[tracemalloc.Snapshot]:
+        """开始内存追踪并返回起始快照（多个阶段共享同一个tracemalloc会话），失败时返回None"""
+        with self._lock:
+            if self._memory_users == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._memory_users += 1
+        try:
+            return tracemalloc.take_snapshot()
+        except Exception as e:
+            logger.warning(f"无法采集内存快照: {e}")
+            self._stop_memory()
+            return None
+
+    def _stop_memory(self):
+        with self._lock:
+            self._memory_users -= 1
+            if self._memory_users == 0 and tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+    def _write_report(self, task_id: str, section: str, record: Dict[str, Any],
+                      profiler: Optional[cProfile.Profile],
+                      memory_before: Optional[tracemalloc.Snapshot]):
+        """写入阶段报告"""
+        report_dir = self.report_dir(task_id)
+        report_dir.mkdir(parents=True, exist_ok=True)
+
+        with self._lock:
+            key = f"{task_id}/{section}"
+            index = self._counters.get(key, 0) + 1
+            self._counters[key] = index
+        prefix = f"{section}-{index}"
+
+        if profiler:
+            profile_file = report_dir / f"{prefix}.prof"
+            profiler.dump_stats(str(profile_file))
+            record["cpu_profile"] = profile_file.name
+
+        if memory_before is not None:
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            stats = snapshot.compare_to(memory_before, "lineno")
+            top = config_manager.app.profile_top
+
+            memory_file = report_dir / f"{prefix}.mem.txt"
+            with open(memory_file, 'w', encoding='utf-8') as f:
+                for stat in stats[:top]:
+                    f.write(f"{stat}\n")
+
+            record["memory_current_bytes"] = current
+            record["memory_peak_bytes"] = peak
+            record["memory_diff_bytes"] = sum(stat.size_diff for stat in stats)
+            record["memory_profile"] = memory_file.name
+
+        with self._lock:
+            with open(report_dir / "report.jsonl", 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        logger.debug(
+            f"剖析 {task_id}/{section}: 墙钟 {record['wall_seconds']}s, "
+            f"CPU {record['thread_cpu_seconds']}s, 等待 {record['wait_seconds']}s"
+        )
+
+    def load_report(self, task_id: str) -> List[Dict[str, Any]]:
+        """读取任务的剖析记录"""
+        report_file = self.report_dir(task_id) / "report.jsonl"
+        if not report_file.exists():
+            return []
+
+        with open(report_file, 'r', encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def summarize(self, task_id: str) -> Dict[str, Dict[str, float]]:
+        """按阶段汇总墙钟/CPU/等待时间"""
+        summary: Dict[str, Dict[str, float]] = {}
+        for record in self.load_report(task_id):
+            entry = summary.setdefault(record["section"], {
+                "count": 0, "wall_seconds": 0.0, "thread_cpu_seconds": 0.0, "wait_seconds": 0.0
+            })
+            entry["count"] += 1
+            for field in ("wall_seconds", "thread_cpu_seconds", "wait_seconds"):
+                entry[field] = round(entry[field] + record[field], 6)
+        return summary
+
+
+# 全局剖析器实例
+task_profiler = TaskProfiler()
@@ -0,0 +1,457 @@
+"""列式结果存储模块
+
+将爬取结果按字段拆分为定长二进制列文件（``data_dir/columns``），
+通过NumPy内存映射读取，筛选、分组、TopK、分位数等聚合均为向量化计算，
+无需重新解析JSON。需要安装可选依赖 ``numpy``。
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from loguru import logger
+
+from .config import config_manager
+from .fields import DEFAULT_COLUMNS, ColumnSpec, lookup, to_float
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 可选依赖
+    np = None
+
+
+_DTYPES = {"float": "<f8", "category": "<i4"}
+
+
+class ColumnarResultStore:
+    """本地列式结果存储
+
+    每列一个追加写入的二进制文件，类别列的取值字典追加写入 ``<列名>.dict.jsonl``，
+    ``meta.json`` 只记录已提交的行数、字典字节数和已写入的来源，
+    读取时按行数创建只读内存映射，因此写入中途失败不会破坏已提交数据。
+    """
+
+    def __init__(self, store_dir: Optional[str] = None,
+                 columns: Optional[Sequence[ColumnSpec]] = None):
+        if np is None:
+            raise ImportError("列式存储需要numpy，请执行 pip install numpy")
+
+        self._store_dir = Path(store_dir or Path(config_manager.app.data_dir) / "columns")
+        self._meta_file = self._store_dir / "meta.json"
+        self._store_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+        self._row_count = 0
+        self._columns: Dict[str, ColumnSpec] = {}
+        self._categories: Dict[str, List[str]] = {}
+        self._category_codes: Dict[str, Dict[str, int]] = {}
+        # 每个字典文件已提交的字节数与取值数
+        self._dict_bytes: Dict[str, int] = {}
+        self._dict_written: Dict[str, int] = {}
+        self._sources: List[str] = []
+        self._maps: Dict[str, Any] = {}
+        self._load_meta(columns or DEFAULT_COLUMNS)
+
+    def _load_meta(self, columns: Sequence[ColumnSpec]):
+        """加载元数据"""
+        # 旧版本把字典内联在meta.json中，加载后在下次保存时迁移到字典文件
+        inline_categories: Dict[str, List[str]] = {}
+        if self._meta_file.exists():
+            with open(self._meta_file, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            self._row_count = meta["row_count"]
+            self._columns = {spec["name"]: ColumnSpec(**spec) for spec in meta["columns"]}
+            self._dict_bytes = meta.get("dictionary_bytes", {})
+            self._sources = meta.get("sources", [])
+            inline_categories = meta.get("categories", {})
+            logger.info(f"列式存储已加载: {self._row_count} 行, {len(self._columns)} 列")
+        else:
+            self._columns = {spec.name: spec for spec in columns}
+
+        for name, spec in self._columns.items():
+            if spec.kind not in _DTYPES:
+                raise ValueError(f"不支持的列类型: {spec.kind}")
+            if spec.kind == "category":
+                if name in inline_categories:
+                    values = inline_categories[name]
+                    self._dict_bytes[name] = 0
+                    self._dict_written[name] = 0
+                else:
+                    values = self._read_dictionary(name)
+                    self._dict_written[name] = len(values)
+                self._categories[name] = values
+                self._category_codes[name] = {value: code for code, value in enumerate(values)}
+
+    def _dict_file(self, name: str) -> Path:
+        return self._store_dir / f"{name}.dict.jsonl"
+
+    def _read_dictionary(self, name: str) -> List[str]:
+        """读取字典文件中已提交的部分"""
+        committed = self._dict_bytes.get(name, 0)
+        if not committed:
+            return []
+        with open(self._dict_file(name), 'rb') as f:
+            data = f.read(committed)
+        return [json.loads(line) for line in data.splitlines() if line]
+
+    def _save_dictionaries(self):
+        """把新增的类别取值追加到字典文件（调用方需持有锁）"""
+        for name, values in self._categories.items():
+            written = self._dict_written.get(name, 0)
+            committed = self._dict_bytes.get(name, 0)
+            if written == len(values):
+                continue
+
+            lines = "".join(json.dumps(value, ensure_ascii=False) + "\n" for value in values[written:])
+            with open(self._dict_file(name), 'ab') as f:
+                # 截断到已提交长度，丢弃上次失败写入残留的数据
+                if f.tell() != committed:
+                    f.truncate(committed)
+                    f.seek(committed)
+                f.write(lines.encode("utf-8"))
+                self._dict_bytes[name] = f.tell()
+            self._dict_written[name] = len(values)
+
+    def _save_meta(self):
+        """追加字典后原子写入元数据（调用方需持有锁）"""
+        self._save_dictionaries()
+        meta = {
+            "row_count": self._row_count,
+            "columns": [spec.dict() for spec in self._columns.values()],
+            "dictionary_bytes": self._dict_bytes,
+            "sources": self._sources,
+        }
+        temp_file = self._meta_file.with_suffix(".tmp")
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(temp_file, self._meta_file)
+
+    def _column_file(self, name: str) -> Path:
+        return self._store_dir / f"{name}.bin"
+
+    @property
+    def row_count(self) -> int:
+        """已提交行数"""
+        return self._row_count
+
+    @property
+    def column_names(self) -> List[str]:
+        """列名列表"""
+        return list(self._columns)
+
+    def has_source(self, source: str) -> bool:
+        """来源是否已完整写入过"""
+        return source in self._sources
+
+    def ingest(self, items: Iterable[Dict[str, Any]], source: Optional[str] = None,
+               batch_size: int = 10000, force: bool = False) -> int:
+        """写入一批数据项，返回写入行数
+
+        ``source`` 记录数据来源（如任务ID或文件名），已写入过的来源默认跳过，
+        ``force`` 为True时仍然写入。未提供时间戳的数据项使用写入时间作为 ``timestamp``。
+        """
+        if source and not force and self.has_source(source):
+            logger.info(f"来源已写入过，跳过: {source}")
+            return 0
+
+        total = 0
+        batch: List[Dict[str, Any]] = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                total += self._ingest_batch(batch, source)
+                batch = []
+        if batch:
+            total += self._ingest_batch(batch, source)
+
+        if source and source not in self._sources:
+            with self._lock:
+                self._sources.append(source)
+                self._save_meta()
+
+        logger.info(f"列式存储写入 {total} 行, 来源: {source}")
+        return total
+
+    def _ingest_batch(self, items: List[Dict[str, Any]], source: Optional[str]) -> int:
+        """按列编码并追加一批数据"""
+        now = time.time()
+        with self._lock:
+            arrays = {}
+            for name, spec in self._columns.items():
+                if name == "source":
+                    raw = [source] * len(items)
+                else:
+                    raw = [self._extract(item, spec) for item in items]
+
+                if spec.kind == "category":
+                    arrays[name] = np.fromiter(
+                        (self._encode(name, value) for value in raw),
+                        dtype=_DTYPES["category"], count=len(items)
+                    )
+                else:
+                    column = np.fromiter((to_float(value) for value in raw),
+                                         dtype=_DTYPES["float"], count=len(items))
+                    if name == "timestamp":
+                        column[np.isnan(column)] = now
+                    arrays[name] = column
+
+            for name, column in arrays.items():
+                column_file = self._column_file(name)
+                # 截断到已提交长度，丢弃上次失败写入残留的数据
+                committed = self._row_count * column.itemsize
+                with open(column_file, 'ab') as f:
+                    if f.tell() != committed:
+                        f.truncate(committed)
+                        f.seek(committed)
+                    f.write(column.tobytes())
+
+            self._row_count += len(items)
+            self._save_meta()
+            self._maps.clear()
+
+        return len(items)
+
+    @staticmethod
+    def _extract(item: Dict[str, Any], spec: ColumnSpec) -> Any:
+        """按候选路径取第一个可用值
+
+        数值列取第一个能转换为数字的值，类别列取第一个非空标量，
+        因此 ``{"price": {"min_price": "12.5"}}`` 会跳过 ``price`` 继续尝试 ``price.min_price``。
+        """
+        for path in spec.paths:
+            value = lookup(item, path)
+            if spec.kind == "float":
+                number = to_float(value)
+                if not math.isnan(number):
+                    return number
+            elif value not in (None, "") and not isinstance(value, (dict, list)):
+                return value
+        return None
+
+    def _encode(self, name: str, value: Any) -> int:
+        """类别列字典编码（调用方需持有锁）"""
+        if value in (None, ""):
+            return -1
+
+        value = str(value)
+        codes = self._category_codes[name]
+        code = codes.get(value)
+        if code is None:
+            code = len(self._categories[name])
+            self._categories[name].append(value)
+            codes[value] = code
+        return code
+
+    def column(self, name: str) -> "np.ndarray":
+        """获取列的只读内存映射"""
+        if name not in self._columns:
+            raise KeyError(f"列不存在: {name}")
+
+        with self._lock:
+            column = self._maps.get(name)
+            if column is None:
+                dtype = _DTYPES[self._columns[name].kind]
+                if self._row_count == 0:
+                    column = np.empty(0, dtype=dtype)
+                else:
+                    column = np.memmap(self._column_file(name), dtype=dtype,
+                                       mode='r', shape=(self._row_count,))
+                self._maps[name] = column
+            return column
+
+    def categories(self, name: str) -> List[str]:
+        """获取类别列的取值字典"""
+        return self._categories[name]
+
+    def code_of(self, name: str, value: Any) -> int:
+        """获取类别值的编码，不存在时返回-2（不会匹配任何行）"""
+        return self._category_codes[name].get(str(value), -2)
+
+    def decode(self, name: str, codes: "np.ndarray") -> List[Optional[str]]:
+        """将类别编码还原为字符串"""
+        values = self._categories[name]
+        return [values[code] if code >= 0 else None for code in codes.tolist()]
+
+    def query(self) -> "ResultQuery":
+        """创建查询"""
+        return ResultQuery(self)
+
+    def clear(self):
+        """清空存储"""
+        with self._lock:
+            self._maps.clear()
+            for name in self._columns:
+                self._column_file(name).unlink(missing_ok=True)
+            self._row_count = 0
+            self._sources = []
+            for name in self._categories:
+                self._dict_file(name).unlink(missing_ok=True)
+                self._categories[name] = []
+                self._category_codes[name] = {}
+                self._dict_bytes[name] = 0
+                self._dict_written[name] = 0
+            self._save_meta()
+        logger.info("列式存储已清空")
+
+
+Condition = Union[Any, Tuple[Optional[float], Optional[float]], List[Any]]
+
+
+class ResultQuery:
+    """列式存储上的向量化查询
+
+    ``filter`` 可链式调用，条件之间为与关系::
+
+        store.query().filter(price=(10, 50), shop_id=["a", "b"]).top_k("sold_count", 20)
+    """
+
+    _AGGREGATES = ("count", "sum", "mean", "min", "max")
+
+    def __init__(self, store: ColumnarResultStore):
+        self._store = store
+        self._mask: Optional["np.ndarray"] = None
+
+    def filter(self, **conditions: Condition) -> "ResultQuery":
+        """按条件筛选
+
+        - 标量：等于
+        - 二元组 ``(low, high)``：闭区间，任一端为None表示不限
+        - 列表/集合：属于其中之一
+        """
+        mask = self.mask()
+        for name, condition in conditions.items():
+            column = self._store.column(name)
+            kind = self._store._columns[name].kind
+
+            if isinstance(condition, tuple):
+                low, high = condition
+                if low is not None:
+                    mask &= column >= low
+                if high is not None:
+                    mask &= column <= high
+            elif isinstance(condition, (list, set, frozenset)):
+                values = list(condition)
+                if kind == "category":
+                    values = [self._store.code_of(name, value) for value in values]
+                mask &= np.isin(column, values)
+            elif kind == "category":
+                mask &= column == self._store.code_of(name, condition)
+            else:
+                mask &= column == condition
+
+        self._mask = mask
+        return self
+
+    def mask(self) -> "np.ndarray":
+        """当前筛选结果的布尔掩码"""
+        if self._mask is None:
+            return np.ones(self._store.row_count, dtype=bool)
+        return self._mask.copy()
+
+    def count(self) -> int:
+        """匹配行数"""
+        return int(self.mask().sum())
+
+    def values(self, name: str) -> "np.ndarray":
+        """匹配行在指定列上的值"""
+        return np.asarray(self._store.column(name)[self.mask()])
+
+    def group_by(self, key: str, value: Optional[str] = None,
+                 agg: str = "count") -> Dict[Optional[str], float]:
+        """按类别列分组聚合（忽略值列中的NaN）"""
+        if agg not in self._AGGREGATES:
+            raise ValueError(f"不支持的聚合方式: {agg}")
+
+        keys = self.values(key)
+        if value is not None:
+            numbers = self.values(value)
+            valid = ~np.isnan(numbers)
+            keys, numbers = keys[valid], numbers[valid]
+        elif agg != "count":
+            raise ValueError("除count外的聚合需要指定value列")
+
+        if keys.size == 0:
+            return {}
+
+        groups, inverse = np.unique(keys, return_inverse=True)
+        if agg == "count":
+            result = np.bincount(inverse, minlength=groups.size).astype(float)
+        elif agg in ("sum", "mean"):
+            result = np.bincount(inverse, weights=numbers, minlength=groups.size)
+            if agg == "mean":
+                result = result / np.bincount(inverse, minlength=groups.size)
+        else:
+            order = np.argsort(inverse, kind="stable")
+            starts = np.searchsorted(inverse[order], np.arange(groups.size))
+            reducer = np.minimum if agg == "min" else np.maximum
+            result = reducer.reduceat(numbers[order], starts)
+
+        if self._store._columns[key].kind == "category":
+            labels = self._store.decode(key, groups)
+        else:
+            labels = groups.tolist()
+        return dict(zip(labels, result.tolist()))
+
+    def top_k(self, name: str, k: int = 10, largest: bool = True,
+              columns: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """按数值列取前k行（忽略NaN）"""
+        rows = np.flatnonzero(self.mask())
+        numbers = np.asarray(self._store.column(name)[rows])
+        valid = ~np.isnan(numbers)
+        rows, numbers = rows[valid], numbers[valid]
+        if rows.size == 0:
+            return []
+
+        k = min(k, rows.size)
+        keys = -numbers if largest else numbers
+        part = np.argpartition(keys, k - 1)[:k]
+        part = part[np.argsort(keys[part], kind="stable")]
+        return self._records(rows[part], columns)
+
+    def percentiles(self, name: str,
+                    q: Sequence[float] = (50, 90, 99)) -> Dict[float, float]:
+        """数值列的分位数（忽略NaN）"""
+        numbers = self.values(name)
+        numbers = numbers[~np.isnan(numbers)]
+        if numbers.size == 0:
+            return {p: math.nan for p in q}
+        return dict(zip(q, np.percentile(numbers, list(q)).tolist()))
+
+    def describe(self, name: str) -> Dict[str, float]:
+        """数值列的基本统计"""
+        numbers = self.values(name)
+        numbers = numbers[~np.isnan(numbers)]
+        if numbers.size == 0:
+            return {"count": 0}
+        return {
+            "count": int(numbers.size),
+            "min": float(numbers.min()),
+            "max": float(numbers.max()),
+            "mean": float(numbers.mean()),
+            "sum": float(numbers.sum()),
+        }
+
+    def records(self, columns: Optional[Sequence[str]] = None,
+                limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """以字典列表返回匹配行"""
+        rows = np.flatnonzero(self.mask())
+        if limit is not None:
+            rows = rows[:limit]
+        return self._records(rows, columns)
+
+    def _records(self, rows: "np.ndarray",
+                 columns: Optional[Sequence[str]]) -> List[Dict[str, Any]]:
+        """按行号组装字典"""
+        names = list(columns or self._store.column_names)
+        data = {}
+        for name in names:
+            values = np.asarray(self._store.column(name)[rows])
+            if self._store._columns[name].kind == "category":
+                data[name] = self._store.decode(name, values)
+            else:
+                data[name] = [None if math.isnan(v) else v for v in values.tolist()]
+        return [dict(zip(names, row)) for row in zip(*(data[name] for name in names))]
@@ -0,0 +1,185 @@
+"""结果摘要模块
+
+在获取数据集的同一次流式遍历中累计摘要统计：精确条数、字段空值率、
+价格最小/最大/均值与分位数、错误项数量以及前N条预览。统计保存在任务上，
+预览较大，由任务管理器单独保存在 ``data_dir/summaries/<task_id>.json``，
+查看状态和预览时无需再次读取数据集。本模块不依赖numpy。
+"""
+
+import math
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+
+from pydantic import BaseModel, Field
+
+from .fields import column_paths, lookup, to_float
+
+# 价格字段候选路径与列式存储保持一致
+PRICE_PATHS = column_paths("price")
+
+# Apify Actor标记失败数据项的字段
+ERROR_KEYS = ("#error", "error", "errorMessage")
+
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+
+
+class QuantileSketch:
+    """对数分桶的分位数草图
+
+    每个桶覆盖 ``[gamma^(i-1), gamma^i)``，估计值的相对误差不超过 ``relative_accuracy``，
+    内存只与数值的量级范围有关而与数据量无关。非正数统一计入零桶。
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy必须在0到1之间")
+
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._bins: Dict[int, int] = {}
+        self._zero_count = 0
+        self.count = 0
+
+    def add(self, value: float):
+        """加入一个数值"""
+        self.count += 1
+        if value <= 0:
+            self._zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self._bins[index] = self._bins.get(index, 0) + 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """估计分位数，``q`` 取值0到1"""
+        if self.count == 0:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self._zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self._bins):
+            seen += self._bins[index]
+            if rank < seen:
+                return 2 * self._gamma ** index / (self._gamma + 1)
+        return 2 * self._gamma ** max(self._bins) / (self._gamma + 1)
+
+
+class PriceSummary(BaseModel):
+    """价格统计"""
+
+    count: int = Field(default=0, description="有价格的数据项数量")
+    min: Optional[float] = Field(default=None, description="最低价格")
+    max: Optional[float] = Field(default=None, description="最高价格")
+    mean: Optional[float] = Field(default=None, description="平均价格")
+    percentiles: Dict[str, float] = Field(default_factory=dict, description="分位数估计，如p50")
+
+
+class ResultSummary(BaseModel):
+    """任务结果摘要"""
+
+    item_count: int = Field(default=0, description="数据项总数")
+    error_count: int = Field(default=0, description="错误数据项数量")
+    null_rates: Dict[str, float] = Field(default_factory=dict, description="顶层字段空值率")
+    price: PriceSummary = Field(default_factory=PriceSummary, description="价格统计")
+    complete: bool = Field(default=True, description="是否完整遍历了数据集")
+    computed_at: datetime = Field(default_factory=datetime.now)
+
+
+class SummaryBuilder:
+    """流式累计结果摘要，也可作为流水线阶段使用（线程安全，原样返回数据项）"""
+
+    def __init__(self, preview_size: int = 10, price_paths: Sequence[str] = PRICE_PATHS,
+                 percentiles: Sequence[int] = DEFAULT_PERCENTILES, max_fields: int = 200,
+                 relative_accuracy: float = 0.01):
+        self.preview_size = preview_size
+        self.price_paths = list(price_paths)
+        self.percentiles = tuple(percentiles)
+        self.max_fields = max_fields
+
+        self._lock = threading.Lock()
+        self._count = 0
+        self._errors = 0
+        self._present: Dict[str, int] = {}
+        self._preview: List[Dict[str, Any]] = []
+        self._sketch = QuantileSketch(relative_accuracy)
+        self._price_min = math.inf
+        self._price_max = -math.inf
+        self._price_sum = 0.0
+
+    def add(self, item: Dict[str, Any]):
+        """累计一个数据项"""
+        if not isinstance(item, dict):
+            with self._lock:
+                self._count += 1
+                self._errors += 1
+            return
+
+        price = math.nan
+        for path in self.price_paths:
+            price = to_float(lookup(item, path))
+            if not math.isnan(price):
+                break
+
+        with self._lock:
+            self._count += 1
+            if any(item.get(key) for key in ERROR_KEYS):
+                self._errors += 1
+
+            for key, value in item.items():
+                # 首次出现即记录字段，全部为空的字段空值率为1
+                if key not in self._present:
+                    if len(self._present) >= self.max_fields:
+                        continue
+                    self._present[key] = 0
+                if value is not None and value != "":
+                    self._present[key] += 1
+
+            if len(self._preview) < self.preview_size:
+                self._preview.append(item)
+
+            if not math.isnan(price):
+                self._sketch.add(price)
+                self._price_min = min(self._price_min, price)
+                self._price_max = max(self._price_max, price)
+                self._price_sum += price
+
+    def __call__(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        self.add(item)
+        return item
+
+    @property
+    def preview(self) -> List[Dict[str, Any]]:
+        """前N条数据预览"""
+        with self._lock:
+            return list(self._preview)
+
+    def build(self, complete: bool = True) -> ResultSummary:
+        """生成摘要"""
+        with self._lock:
+            count = self._count
+            null_rates = {
+                key: round(1 - present / count, 4) for key, present in sorted(self._present.items())
+            } if count else {}
+
+            price = PriceSummary(count=self._sketch.count)
+            if self._sketch.count:
+                price.min = self._price_min
+                price.max = self._price_max
+                price.mean = round(self._price_sum / self._sketch.count, 4)
+                # 草图估计值可能略超出真实范围，截断到最小/最大值之间
+                price.percentiles = {
+                    f"p{p}": round(min(max(self._sketch.quantile(p / 100), self._price_min),
+                                       self._price_max), 4)
+                    for p in self.percentiles
+                }
+
+            return ResultSummary(
+                item_count=count,
+                error_count=self._errors,
+                null_rates=null_rates,
+                price=price,
+                complete=complete
+            )
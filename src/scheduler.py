@@ -0,0 +1,528 @@
+"""定时任务调度模块
+
+基于TaskManager的进程内调度器，支持cron表达式和固定间隔两种周期，
+使用堆实现的定时队列驱动大量周期任务。
+"""
+
+import heapq
+import json
+import os
+import random
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from enum import Enum
+from pathlib import Path
+from typing import Dict, List, Optional, Any, Set, Tuple
+
+from loguru import logger
+from pydantic import BaseModel, Field
+
+from .config import config_manager
+from .task_manager import task_manager
+
+
+class OverlapPolicy(str, Enum):
+    """上一次运行未结束时的触发策略"""
+    SKIP = "skip"          # 丢弃本次触发
+    COALESCE = "coalesce"  # 合并为一次，在上一次结束后立即补跑
+
+
+class CronExpression:
+    """五段式cron表达式（分 时 日 月 周）
+
+    支持 ``*``、``*/n``、``a-b``、``a-b/n`` 以及逗号分隔的列表，
+    周字段中0和7均表示周日。
+    """
+
+    _RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"cron表达式需要5个字段: {expression}")
+
+        self.expression = expression
+        fields = [self._parse_field(part, low, high, index == 4)
+                  for index, (part, (low, high)) in enumerate(zip(parts, self._RANGES))]
+        self.minutes, self.hours, self.days, self.months, self.weekdays = fields
+        # 与标准cron一致：日和周同时受限时取并集
+        self._day_restricted = parts[2] != "*"
+        self._weekday_restricted = parts[4] != "*"
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int, is_weekday: bool) -> Set[int]:
+        """解析单个字段"""
+        values: Set[int] = set()
+        for chunk in field.split(","):
+            step = 1
+            if "/" in chunk:
+                chunk, step_text = chunk.split("/", 1)
+                step = int(step_text)
+                if step <= 0:
+                    raise ValueError(f"cron步长必须为正数: {field}")
+
+            if chunk == "*":
+                start, end = low, high
+            elif "-" in chunk:
+                start_text, end_text = chunk.split("-", 1)
+                start, end = int(start_text), int(end_text)
+            else:
+                start = int(chunk)
+                end = high if step > 1 else start
+
+            if is_weekday:
+                # 允许7表示周日
+                if not (low <= start <= 7 and low <= end <= 7):
+                    raise ValueError(f"cron字段超出范围: {field}")
+                values.update(v % 7 for v in range(start, end + 1, step))
+                continue
+
+            if not (low <= start <= high and low <= end <= high):
+                raise ValueError(f"cron字段超出范围: {field}")
+            values.update(range(start, end + 1, step))
+
+        return values
+
+    def _day_matches(self, moment: datetime) -> bool:
+        """检查日期是否匹配日/周字段"""
+        day_ok = moment.day in self.days
+        # datetime.weekday(): 周一为0，cron中周日为0
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._day_restricted and self._weekday_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, moment: datetime) -> datetime:
+        """计算严格晚于给定时间的下一次触发时间"""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+
+        while candidate < limit:
+            if candidate.month not in self.months:
+                # 跳到下个月第一天
+                year = candidate.year + (1 if candidate.month == 12 else 0)
+                month = 1 if candidate.month == 12 else candidate.month + 1
+                candidate = candidate.replace(year=year, month=month, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+                continue
+            if candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+                continue
+            return candidate
+
+        raise ValueError(f"cron表达式无可用触发时间: {self.expression}")
+
+
+class Schedule(BaseModel):
+    """周期任务模板"""
+
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str = Field(..., description="调度名称")
+    actor_id: str = Field(..., description="Actor ID")
+    input_data: Dict[str, Any] = Field(default_factory=dict, description="输入数据")
+    task_options: Dict[str, Any] = Field(default_factory=dict, description="传给create_task的额外参数")
+    cron: Optional[str] = Field(default=None, description="cron表达式")
+    interval_seconds: Optional[int] = Field(default=None, description="固定间隔(秒)")
+    jitter_seconds: int = Field(default=0, description="随机抖动上限(秒)")
+    overlap_policy: OverlapPolicy = Field(default=OverlapPolicy.SKIP, description="重叠触发策略")
+    enabled: bool = Field(default=True, description="是否启用")
+    created_at: datetime = Field(default_factory=datetime.now)
+    last_run_at: Optional[datetime] = Field(default=None)
+    last_task_id: Optional[str] = Field(default=None)
+    run_count: int = Field(default=0, description="已触发次数")
+    skipped_count: int = Field(default=0, description="被跳过/合并的触发次数")
+
+    class Config:
+        use_enum_values = True
+
+    def next_fire_time(self, after: datetime) -> datetime:
+        """计算下一次计划触发时间（不含抖动）"""
+        if self.cron:
+            return CronExpression(self.cron).next_after(after)
+        return after + timedelta(seconds=self.interval_seconds)
+
+
+class TaskScheduler:
+    """周期任务调度器
+
+    定时队列为 ``(触发时间, 序号, 调度ID)`` 组成的最小堆，
+    调度线程只在最早的触发时间醒来，因此开销与调度数量无关。
+    触发产生的运行统计只标记为待保存，由后台线程每隔 ``SAVE_INTERVAL`` 秒合并写入一次。
+    """
+
+    SAVE_INTERVAL = 5.0
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self._schedules: Dict[str, Schedule] = {}
+        self._heap: List[Tuple[datetime, int, str]] = []
+        self._next_due: Dict[str, datetime] = {}
+        # 不含抖动的计划触发时间，下一次触发从这里推算，避免抖动逐次累积
+        self._next_base: Dict[str, datetime] = {}
+        self._counter = 0
+        self._running: Set[str] = set()
+        self._pending: Set[str] = set()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._saver: Optional[threading.Thread] = None
+        self._saver_stop = threading.Event()
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._stopped = True
+        self._max_workers = max_workers or config_manager.app.scheduler_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._retired_executors: List[ThreadPoolExecutor] = []
+        self._schedules_file = Path(config_manager.app.data_dir) / "schedules.json"
+        self._load_schedules()
+        config_manager.subscribe(self._on_config_change)
+
+    def _on_config_change(self, changes: Dict[str, Any]):
+        """并发数与数据目录变更时调整调度器"""
+        if "app.scheduler_workers" in changes:
+            self.set_max_workers(changes["app.scheduler_workers"][1])
+        if "app.data_dir" in changes:
+            self.relocate(changes["app.data_dir"][1])
+
+    def relocate(self, data_dir: str) -> bool:
+        """切换数据目录：新目录已有的调度按ID合并（同ID以内存中的为准）后写入新目录"""
+        schedules_file = Path(data_dir) / "schedules.json"
+        try:
+            existing = self._read_schedules(schedules_file)
+        except Exception as e:
+            logger.error(f"读取目标目录的调度失败，保留原目录: {schedules_file}, 错误: {e}")
+            return False
+
+        with self._cond:
+            self._schedules_file = schedules_file
+            now = datetime.now()
+            for schedule in existing:
+                if schedule.id in self._schedules:
+                    continue
+                self._schedules[schedule.id] = schedule
+                if not self._stopped and schedule.enabled:
+                    self._push(schedule, now)
+            self._cond.notify()
+        self._save_schedules()
+
+        logger.info(f"调度文件已切换: {schedules_file}, 合并了 {len(existing)} 个已有调度")
+        return True
+
+    def set_max_workers(self, max_workers: int):
+        """调整并发数：之后的触发使用新线程池，旧线程池中运行中的任务继续执行完"""
+        if max_workers <= 0:
+            logger.error(f"调度并发数必须为正数: {max_workers}")
+            return
+
+        with self._cond:
+            if max_workers == self._max_workers:
+                return
+            self._max_workers = max_workers
+            if self._executor:
+                self._retired_executors.append(self._executor)
+                self._executor.shutdown(wait=False)
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max_workers, thread_name_prefix="scheduler"
+                )
+
+        logger.info(f"调度并发数已调整为: {max_workers}")
+
+    @staticmethod
+    def _read_schedules(schedules_file: Path) -> List[Schedule]:
+        """读取调度文件，文件不存在时返回空列表"""
+        if not schedules_file.exists():
+            return []
+
+        with open(schedules_file, 'r', encoding='utf-8') as f:
+            return [Schedule(**schedule_data) for schedule_data in json.load(f)]
+
+    def _load_schedules(self):
+        """加载调度模板"""
+        try:
+            for schedule in self._read_schedules(self._schedules_file):
+                self._schedules[schedule.id] = schedule
+
+            if self._schedules:
+                logger.info(f"加载了 {len(self._schedules)} 个调度")
+
+        except Exception as e:
+            logger.error(f"加载调度失败: {e}")
+
+    def _save_schedules(self):
+        """保存调度模板（调用方不应持有锁，文件写入在锁外进行）"""
+        try:
+            with self._cond:
+                schedules_data = [schedule.dict() for schedule in self._schedules.values()]
+                schedules_file = self._schedules_file
+                self._dirty = False
+
+            with self._save_lock:
+                schedules_file.parent.mkdir(parents=True, exist_ok=True)
+                temp_file = schedules_file.with_suffix(".tmp")
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(schedules_data, f, ensure_ascii=False, indent=2, default=str)
+                os.replace(temp_file, schedules_file)
+
+            logger.debug("调度保存成功")
+
+        except Exception as e:
+            logger.error(f"保存调度失败: {e}")
+
+    def _saver_loop(self):
+        """定期合并保存触发产生的运行统计"""
+        while not self._saver_stop.wait(self.SAVE_INTERVAL):
+            if self._dirty:
+                self._save_schedules()
+
+    def _push(self, schedule: Schedule, after: datetime) -> bool:
+        """将调度在给定时间之后的下一次触发放入堆中，没有可用触发时间时返回False（调用方需持有锁）"""
+        try:
+            base = schedule.next_fire_time(after)
+        except ValueError as e:
+            logger.error(f"调度无法排期: {schedule.name}, 错误: {e}")
+            return False
+        self._enqueue(schedule, base)
+        return True
+
+    def _enqueue(self, schedule: Schedule, base: datetime):
+        """按计划时间加上随机抖动入堆（调用方需持有锁）"""
+        fire_at = base
+        if schedule.jitter_seconds:
+            fire_at += timedelta(seconds=random.uniform(0, schedule.jitter_seconds))
+
+        self._counter += 1
+        self._next_base[schedule.id] = base
+        self._next_due[schedule.id] = fire_at
+        heapq.heappush(self._heap, (fire_at, self._counter, schedule.id))
+
+    def add_schedule(self, name: str, actor_id: str, input_data: Dict[str, Any] = None,
+                     cron: str = None, interval_seconds: int = None,
+                     jitter_seconds: int = 0,
+                     overlap_policy: OverlapPolicy = OverlapPolicy.SKIP,
+                     **task_options) -> Optional[Schedule]:
+        """添加周期任务"""
+        if bool(cron) == bool(interval_seconds):
+            logger.error("必须且只能指定cron或interval_seconds之一")
+            return None
+
+        try:
+            if cron:
+                CronExpression(cron)
+            elif interval_seconds <= 0:
+                raise ValueError("interval_seconds必须为正数")
+
+            schedule = Schedule(
+                name=name,
+                actor_id=actor_id,
+                input_data=input_data or {},
+                task_options=task_options,
+                cron=cron,
+                interval_seconds=interval_seconds,
+                jitter_seconds=jitter_seconds,
+                overlap_policy=overlap_policy
+            )
+            # 语法正确但永不触发的cron（如2月31日）在加入前拒绝
+            first_base = schedule.next_fire_time(datetime.now())
+        except Exception as e:
+            logger.error(f"创建调度失败: {e}")
+            return None
+
+        with self._cond:
+            self._schedules[schedule.id] = schedule
+            self._enqueue(schedule, first_base)
+            self._cond.notify()
+        self._save_schedules()
+
+        logger.info(f"添加调度: {schedule.name} ({schedule.id})")
+        return schedule
+
+    def remove_schedule(self, schedule_id: str) -> bool:
+        """删除周期任务（堆中残留条目在弹出时被丢弃）"""
+        with self._cond:
+            schedule = self._schedules.pop(schedule_id, None)
+            if not schedule:
+                logger.error(f"调度不存在: {schedule_id}")
+                return False
+
+            self._next_due.pop(schedule_id, None)
+            self._next_base.pop(schedule_id, None)
+            self._pending.discard(schedule_id)
+        self._save_schedules()
+
+        logger.info(f"调度已删除: {schedule.name}")
+        return True
+
+    def set_enabled(self, schedule_id: str, enabled: bool) -> bool:
+        """启用或暂停周期任务"""
+        with self._cond:
+            schedule = self._schedules.get(schedule_id)
+            if not schedule:
+                logger.error(f"调度不存在: {schedule_id}")
+                return False
+
+            if enabled and schedule_id not in self._next_due:
+                if not self._push(schedule, datetime.now()):
+                    return False
+                self._cond.notify()
+            schedule.enabled = enabled
+            if not enabled:
+                self._next_due.pop(schedule_id, None)
+                self._next_base.pop(schedule_id, None)
+        self._save_schedules()
+
+        return True
+
+    def get_schedule(self, schedule_id: str) -> Optional[Schedule]:
+        """获取周期任务"""
+        return self._schedules.get(schedule_id)
+
+    def list_schedules(self) -> List[Schedule]:
+        """列出周期任务"""
+        schedules = list(self._schedules.values())
+        schedules.sort(key=lambda x: x.created_at)
+        return schedules
+
+    def next_run_time(self, schedule_id: str) -> Optional[datetime]:
+        """获取下一次触发时间"""
+        return self._next_due.get(schedule_id)
+
+    def start(self):
+        """启动调度线程"""
+        with self._cond:
+            if not self._stopped:
+                return
+
+            self._stopped = False
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers, thread_name_prefix="scheduler"
+            )
+            now = datetime.now()
+            for schedule in self._schedules.values():
+                if schedule.enabled and schedule.id not in self._next_due:
+                    self._push(schedule, now)
+
+        self._thread = threading.Thread(target=self._loop, name="task-scheduler", daemon=True)
+        self._thread.start()
+        self._saver_stop.clear()
+        self._saver = threading.Thread(target=self._saver_loop, name="scheduler-saver", daemon=True)
+        self._saver.start()
+        logger.info(f"调度器已启动，共 {len(self._schedules)} 个调度")
+
+    def stop(self, wait: bool = True):
+        """停止调度线程"""
+        with self._cond:
+            if self._stopped:
+                return
+            self._stopped = True
+            self._cond.notify()
+
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._executor:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+        for executor in self._retired_executors:
+            executor.shutdown(wait=wait)
+        self._retired_executors = []
+
+        if self._saver:
+            self._saver_stop.set()
+            self._saver.join()
+            self._saver = None
+        if self._dirty:
+            self._save_schedules()
+
+        logger.info("调度器已停止")
+
+    def _loop(self):
+        """调度主循环"""
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+
+                fire_at, _, schedule_id = self._heap[0]
+                delay = (fire_at - datetime.now()).total_seconds()
+                if delay > 0:
+                    self._cond.wait(timeout=delay)
+                    continue
+
+                heapq.heappop(self._heap)
+                schedule = self._schedules.get(schedule_id)
+                # 已删除、已暂停或被重新排期的过期条目直接丢弃
+                if (not schedule or not schedule.enabled
+                        or self._next_due.get(schedule_id) != fire_at):
+                    continue
+
+                self._enqueue(schedule, self._following_base(schedule, fire_at))
+                self._fire(schedule)
+
+    def _following_base(self, schedule: Schedule, fire_at: datetime) -> datetime:
+        """从本次的计划时间（不含抖动）推算下一次计划时间（调用方需持有锁）"""
+        now = datetime.now()
+        base = schedule.next_fire_time(self._next_base.get(schedule.id, fire_at))
+        # 落后超过抖动窗口（如进程挂起）时从当前时间重新计算，不补跑错过的触发
+        if base < now - timedelta(seconds=schedule.jitter_seconds):
+            base = schedule.next_fire_time(now)
+        return base
+
+    def _fire(self, schedule: Schedule):
+        """处理一次触发（调用方需持有锁）"""
+        if schedule.id in self._running:
+            schedule.skipped_count += 1
+            self._dirty = True
+            if schedule.overlap_policy == OverlapPolicy.COALESCE:
+                self._pending.add(schedule.id)
+                logger.debug(f"调度仍在运行，合并触发: {schedule.name}")
+            else:
+                logger.info(f"调度仍在运行，跳过本次触发: {schedule.name}")
+            return
+
+        self._running.add(schedule.id)
+        self._executor.submit(self._run_schedule, schedule.id)
+
+    def _run_schedule(self, schedule_id: str):
+        """在工作线程中创建并运行任务"""
+        while True:
+            schedule = self._schedules.get(schedule_id)
+            if schedule:
+                try:
+                    task = task_manager.create_task(
+                        name=schedule.name,
+                        actor_id=schedule.actor_id,
+                        input_data=schedule.input_data,
+                        description=f"调度任务 {schedule.id}",
+                        **schedule.task_options
+                    )
+
+                    with self._cond:
+                        schedule.run_count += 1
+                        schedule.last_run_at = datetime.now()
+                        schedule.last_task_id = task.id
+                        self._dirty = True
+
+                    task_manager.run_task(task.id)
+
+                except Exception as e:
+                    logger.error(f"调度运行失败: {schedule.name}, 错误: {e}")
+
+            with self._cond:
+                if schedule_id in self._pending and not self._stopped:
+                    self._pending.discard(schedule_id)
+                    continue
+                self._running.discard(schedule_id)
+                return
+
+
+# 全局调度器实例
+task_scheduler = TaskScheduler()
@@ -0,0 +1,135 @@
+"""JSON编解码模块
+
+数据集内容、任务存储和结果文件统一经过这里编解码。安装了 ``orjson`` 或 ``msgspec``
+时自动使用（可通过 ``APP_JSON_CODEC`` 指定），否则回退到标准库 ``json``。
+输出默认为紧凑的UTF-8字节，不做缩进和ASCII转义。
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple, Union
+
+from loguru import logger
+
+from .config import config_manager
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - 可选依赖
+    msgspec = None
+
+JsonInput = Union[bytes, bytearray, memoryview, str]
+
+
+def _default(value: Any) -> Any:
+    """无法直接序列化的对象（如Decimal、Path）转为字符串"""
+    return str(value)
+
+
+def _stdlib_codec() -> Tuple[Callable, Callable]:
+    def dumps(obj: Any, pretty: bool = False) -> bytes:
+        if pretty:
+            text = json.dumps(obj, ensure_ascii=False, indent=2, default=_default)
+        else:
+            text = json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default)
+        return text.encode("utf-8")
+
+    def loads(data: JsonInput) -> Any:
+        if isinstance(data, memoryview):
+            data = data.tobytes()
+        return json.loads(data)
+
+    return dumps, loads
+
+
+def _orjson_codec() -> Tuple[Callable, Callable]:
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj: Any, pretty: bool = False) -> bytes:
+        option = options | orjson.OPT_INDENT_2 if pretty else options
+        return orjson.dumps(obj, default=_default, option=option)
+
+    return dumps, orjson.loads
+
+
+def _msgspec_codec() -> Tuple[Callable, Callable]:
+    encoder = msgspec.json.Encoder(enc_hook=_default)
+    decoder = msgspec.json.Decoder()
+
+    def dumps(obj: Any, pretty: bool = False) -> bytes:
+        data = encoder.encode(obj)
+        return msgspec.json.format(data, indent=2) if pretty else data
+
+    return dumps, decoder.decode
+
+
+_CODECS: Dict[str, Callable[[], Tuple[Callable, Callable]]] = {
+    "stdlib": _stdlib_codec,
+}
+if orjson is not None:
+    _CODECS["orjson"] = _orjson_codec
+if msgspec is not None:
+    _CODECS["msgspec"] = _msgspec_codec
+
+
+def available_codecs() -> list:
+    """当前环境可用的编解码器"""
+    return list(_CODECS)
+
+
+def get_codec(name: str = "auto") -> Tuple[str, Callable, Callable]:
+    """获取编解码器 ``(名称, dumps, loads)``，auto按orjson、msgspec、stdlib顺序选择"""
+    if name == "auto":
+        name = next(n for n in ("orjson", "msgspec", "stdlib") if n in _CODECS)
+    elif name not in _CODECS:
+        logger.warning(f"JSON编解码器不可用: {name}，回退到stdlib")
+        name = "stdlib"
+
+    dumps, loads = _CODECS[name]()
+    return name, dumps, loads
+
+
+codec_name, _dumps, _loads = get_codec(config_manager.app.json_codec)
+
+
+def _on_config_change(changes: Dict[str, Any]):
+    """配置中的编解码器变更时切换（各编解码器输出互相兼容）"""
+    global codec_name, _dumps, _loads
+    if "app.json_codec" in changes:
+        codec_name, _dumps, _loads = get_codec(config_manager.app.json_codec)
+        logger.info(f"JSON编解码器已切换: {codec_name}")
+
+
+config_manager.subscribe(_on_config_change)
+
+
+def dumps(obj: Any, pretty: bool = False) -> bytes:
+    """序列化为UTF-8字节，默认紧凑格式"""
+    return _dumps(obj, pretty)
+
+
+def loads(data: JsonInput) -> Any:
+    """从字节或字符串解析，字节输入不经过中间解码"""
+    return _loads(data)
+
+
+def dump_file(obj: Any, filepath: Union[str, Path], pretty: bool = False, atomic: bool = False):
+    """写入JSON文件，``atomic`` 为True时先写临时文件再替换"""
+    filepath = Path(filepath)
+    target = filepath.with_suffix(filepath.suffix + ".tmp") if atomic else filepath
+    with open(target, 'wb') as f:
+        f.write(_dumps(obj, pretty))
+    if atomic:
+        os.replace(target, filepath)
+
+
+def load_file(filepath: Union[str, Path]) -> Any:
+    """读取JSON文件"""
+    with open(filepath, 'rb') as f:
+        return _loads(f.read())
@@ -0,0 +1,139 @@
+"""任务归档模块
+
+将已结束的历史任务按创建日期分区写入 ``data_dir/archive/YYYY/MM/tasks-YYYY-MM-DD.jsonl.gz``，
+归档后的任务不再常驻内存和 ``tasks.json``，需要时按日期范围流式查询。
+"""
+
+import gzip
+import os
+import shutil
+from datetime import date, timedelta
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List, Optional
+
+from loguru import logger
+
+from . import serialization
+
+if TYPE_CHECKING:
+    from .task_manager import Task
+
+
+class TaskArchive:
+    """按日期分区的gzip任务归档"""
+
+    def __init__(self, archive_dir: Path):
+        self._archive_dir = Path(archive_dir)
+
+    def _partition_file(self, day: date) -> Path:
+        return self._archive_dir / f"{day:%Y}" / f"{day:%m}" / f"tasks-{day:%Y-%m-%d}.jsonl.gz"
+
+    @staticmethod
+    def _partition_day(partition_file: Path) -> date:
+        return date.fromisoformat(partition_file.name[len("tasks-"):-len(".jsonl.gz")])
+
+    def partitions(self, start: Optional[date] = None,
+                   end: Optional[date] = None) -> List[Path]:
+        """列出日期范围内的分区文件（闭区间）"""
+        result = []
+        for partition_file in sorted(self._archive_dir.glob("*/*/tasks-*.jsonl.gz")):
+            day = self._partition_day(partition_file)
+            if start and day < start:
+                continue
+            if end and day > end:
+                continue
+            result.append(partition_file)
+        return result
+
+    def append(self, tasks: Iterable["Task"]) -> int:
+        """按创建日期追加任务到分区，返回归档数量
+
+        gzip允许多个成员首尾相接，因此追加无需重写已有分区。
+        """
+        grouped: Dict[date, List[bytes]] = {}
+        for task in tasks:
+            line = serialization.dumps(task.dict())
+            grouped.setdefault(task.created_at.date(), []).append(line)
+
+        count = 0
+        for day, lines in grouped.items():
+            partition_file = self._partition_file(day)
+            partition_file.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(partition_file, 'ab') as f:
+                f.write(b"\n".join(lines) + b"\n")
+            count += len(lines)
+
+        return count
+
+    def iterate(self, start: Optional[date] = None,
+                end: Optional[date] = None) -> Iterator["Task"]:
+        """按日期范围流式读取归档任务"""
+        from .task_manager import Task
+
+        for partition_file in self.partitions(start, end):
+            try:
+                with gzip.open(partition_file, 'rb') as f:
+                    for line in f:
+                        if line.strip():
+                            yield Task(**serialization.loads(line))
+            except (OSError, EOFError) as e:
+                logger.error(f"读取归档分区失败: {partition_file}, 错误: {e}")
+
+    def compact(self) -> Dict[str, int]:
+        """合并分区内的gzip成员并按任务ID去重（保留最后写入的记录）"""
+        stats = {"partitions": 0, "tasks": 0, "duplicates": 0}
+
+        for partition_file in self.partitions():
+            records: Dict[str, bytes] = {}
+            lines = 0
+            with gzip.open(partition_file, 'rb') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    lines += 1
+                    records[serialization.loads(line)["id"]] = line
+
+            temp_file = partition_file.with_name(partition_file.name + ".tmp")
+            with gzip.open(temp_file, 'wb', compresslevel=9) as f:
+                f.write(b"\n".join(records.values()) + b"\n")
+            os.replace(temp_file, partition_file)
+
+            stats["partitions"] += 1
+            stats["tasks"] += len(records)
+            stats["duplicates"] += lines - len(records)
+
+        logger.info(
+            f"归档压缩完成: {stats['partitions']} 个分区, "
+            f"{stats['tasks']} 个任务, 去除重复 {stats['duplicates']} 条"
+        )
+        return stats
+
+    def move_to(self, archive_dir: Path) -> int:
+        """将全部分区移动到另一个归档目录，返回移动的分区数量
+
+        目标目录已有同一天的分区时追加到其后（gzip成员可首尾相接），不会覆盖。
+        """
+        archive_dir = Path(archive_dir)
+        count = 0
+        for partition_file in self.partitions():
+            target = archive_dir / partition_file.relative_to(self._archive_dir)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            if target.exists():
+                with open(partition_file, 'rb') as src, open(target, 'ab') as dst:
+                    shutil.copyfileobj(src, dst)
+                partition_file.unlink()
+            else:
+                shutil.move(str(partition_file), str(target))
+            count += 1
+        logger.info(f"移动了 {count} 个归档分区到: {archive_dir}")
+        return count
+
+    def remove_before(self, day: date) -> int:
+        """删除早于指定日期的分区，返回删除数量"""
+        count = 0
+        for partition_file in self.partitions(end=day - timedelta(days=1)):
+            partition_file.unlink()
+            count += 1
+        logger.info(f"删除了 {count} 个归档分区")
+        return count
@@ -3,18 +3,26 @@
 负责管理数据获取任务的创建、执行、监控和结果处理。
 """
 
-import json
+import shutil
+import threading
 import uuid
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 from enum import Enum
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any, Tuple
 
 from loguru import logger
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 
 from .apify_service import apify_client
 from .config import config_manager
+from .locking import file_lock
+from .pipeline import Pipeline
+from .profiling import task_profiler
+from .result_summary import ResultSummary, SummaryBuilder
+from . import serialization
+from .task_archive import TaskArchive
 
 
 class TaskStatus(str, Enum):
@@ -48,22 +56,94 @@ class Task(BaseModel):
     completed_at: Optional[datetime] = Field(default=None)
     run_id: Optional[str] = Field(default=None, description="Apify运行ID")
     dataset_id: Optional[str] = Field(default=None, description="数据集ID")
+    account: Optional[str] = Field(default=None, description="运行所属的Apify账号标识")
     error_message: Optional[str] = Field(default=None, description="错误信息")
     result_count: int = Field(default=0, description="结果数量")
+    summary: Optional[ResultSummary] = Field(default=None, description="结果摘要")
+    tags: List[str] = Field(default_factory=list, description="任务标签")
+    profile_dir: Optional[str] = Field(default=None, description="性能剖析报告目录")
+    
+    class Config:
+        use_enum_values = True
+
+
+class RetentionPolicy(BaseModel):
+    """任务保留策略"""
+    
+    max_age_days: Optional[int] = Field(default=30, description="已结束任务的最长保留天数")
+    max_tasks: Optional[int] = Field(default=1000, description="内存中保留的最大任务数")
+    statuses: List[TaskStatus] = Field(
+        default_factory=lambda: [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED],
+        description="允许归档的任务状态"
+    )
+    tag_max_age_days: Dict[str, int] = Field(
+        default_factory=lambda: {"quick_run": 1},
+        description="按标签单独设置的保留天数"
+    )
     
     class Config:
         use_enum_values = True
 
 
 class TaskManager:
-    """任务管理器"""
+    """任务管理器
+    
+    多个进程（如CLI的submit、run、wait）可以同时使用同一个任务文件：每次保存都在文件锁内
+    先合并磁盘上其他进程的修改再写回。本进程修改过的任务以本进程为准，
+    未修改的任务采用磁盘上的版本（就地更新，运行中的线程持有的对象保持有效）。
+    """
     
     def __init__(self):
         self._tasks: Dict[str, Task] = {}
+        # 上次与磁盘同步时各任务的内容，用于判断本进程修改过哪些任务
+        self._persisted: Dict[str, Dict[str, Any]] = {}
+        self._store_state: Optional[Tuple[int, int, int]] = None
+        self._store_depth = 0
         self._data_dir = Path(config_manager.app.data_dir)
         self._tasks_file = self._data_dir / "tasks.json"
+        self._archive = TaskArchive(self._data_dir / "archive")
+        self._result_pipeline: Optional[Pipeline] = None
+        self._lock = threading.RLock()
         self._ensure_data_dir()
         self._load_tasks()
+        config_manager.subscribe(self._on_config_change)
+    
+    def _on_config_change(self, changes: Dict[str, Any]):
+        """数据目录变更时迁移任务存储"""
+        if "app.data_dir" in changes:
+            self.relocate(changes["app.data_dir"][1])
+    
+    def relocate(self, data_dir: str) -> bool:
+        """切换数据目录
+        
+        内存中的任务直接写入新目录；运行中的任务之后的保存也写入新目录。
+        新目录已有的任务文件与内存中的任务合并（同ID以内存中的为准），
+        历史归档和结果预览移动到新目录，原目录的任务文件保留不动。
+        """
+        new_dir = Path(data_dir)
+        with self._lock:
+            if new_dir.resolve() == self._data_dir.resolve():
+                return True
+            
+            try:
+                new_dir.mkdir(parents=True, exist_ok=True)
+                with file_lock(self._lock_file):
+                    self._archive.move_to(new_dir / "archive")
+                self._move_previews(new_dir / "summaries")
+            except Exception as e:
+                logger.error(f"切换数据目录失败: {new_dir}, 错误: {e}")
+                return False
+            
+            self._data_dir = new_dir
+            self._tasks_file = new_dir / "tasks.json"
+            self._archive = TaskArchive(new_dir / "archive")
+            # 新目录的任务文件视为未同步过，合并时其中的任务全部加入
+            self._persisted = {}
+            self._store_state = None
+            self._save_tasks()
+        
+        logger.info(f"任务数据目录已切换: {new_dir}")
+        return True
     
     def _ensure_data_dir(self):
         """确保数据目录存在"""
@@ -77,33 +157,167 @@ class TaskManager:
             return
         
         try:
-            with open(self._tasks_file, 'r', encoding='utf-8') as f:
-                tasks_data = json.load(f)
-            
-            for task_data in tasks_data:
-                task = Task(**task_data)
-                self._tasks[task.id] = task
-            
+            with self._lock:
+                self._merge_from_disk()
             logger.info(f"加载了 {len(self._tasks)} 个任务")
             
         except Exception as e:
             logger.error(f"加载任务失败: {e}")
     
-    def _save_tasks(self):
-        """保存任务"""
+    def reload(self):
+        """合并任务文件中其他进程的更新"""
+        try:
+            with self._store_transaction(write=False):
+                pass
+        except Exception as e:
+            logger.error(f"重新加载任务失败: {e}")
+    
+    @property
+    def _lock_file(self) -> Path:
+        return self._tasks_file.with_name(self._tasks_file.name + ".lock")
+    
+    def _stat_store(self) -> Optional[Tuple[int, int, int]]:
         try:
-            tasks_data = [task.dict() for task in self._tasks.values()]
+            stat = self._tasks_file.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+    
+    def _merge_from_disk(self):
+        """合并磁盘上的任务（调用方需持有锁），文件未变化时不解析"""
+        state = self._stat_store()
+        if state is None or state == self._store_state:
+            return
+        
+        disk_tasks = {task.id: task for task in
+                      (self._task_from_data(data) for data in serialization.load_file(self._tasks_file))}
+        
+        for task_id, disk_task in disk_tasks.items():
+            task = self._tasks.get(task_id)
+            persisted = self._persisted.get(task_id)
+            disk_data = disk_task.dict()
+            if task is None:
+                if persisted is None:
+                    # 其他进程新建的任务
+                    self._tasks[task_id] = disk_task
+                    self._persisted[task_id] = disk_data
+                # 否则为本进程已删除/归档的任务，写回时丢弃
+            elif task.dict() == persisted and disk_data != persisted:
+                # 本进程未修改过，采用其他进程的版本
+                for field in Task.model_fields:
+                    setattr(task, field, getattr(disk_task, field))
+                self._persisted[task_id] = disk_data
+        
+        for task_id in list(self._tasks):
+            if task_id not in disk_tasks and task_id in self._persisted:
+                # 其他进程已删除/归档；本进程修改过的任务保留
+                if self._tasks[task_id].dict() == self._persisted[task_id]:
+                    del self._tasks[task_id]
+                del self._persisted[task_id]
+        
+        self._store_state = state
+    
+    def _task_from_data(self, data: Dict[str, Any]) -> Task:
+        """从任务文件的记录创建任务，旧版本保存在摘要中的预览迁移到单独的文件"""
+        preview = (data.get("summary") or {}).get("preview")
+        if preview and not self._preview_file(data["id"]).exists():
+            self._save_preview(data["id"], preview)
+        return Task(**data)
+    
+    def _write_store(self):
+        """写入任务文件（调用方需持有锁和文件锁）"""
+        tasks_data = [task.dict() for task in self._tasks.values()]
+        serialization.dump_file(tasks_data, self._tasks_file, atomic=True)
+        self._persisted = {data["id"]: data for data in tasks_data}
+        self._store_state = self._stat_store()
+    
+    @contextmanager
+    def _store_transaction(self, write: bool = True) -> Iterator[None]:
+        """在文件锁内合并磁盘上的修改，执行代码块后写回（可嵌套，由最外层写回）"""
+        with self._lock:
+            if self._store_depth:
+                yield
+                return
             
-            with open(self._tasks_file, 'w', encoding='utf-8') as f:
-                json.dump(tasks_data, f, ensure_ascii=False, indent=2, default=str)
+            self._data_dir.mkdir(parents=True, exist_ok=True)
+            with file_lock(self._lock_file):
+                self._store_depth += 1
+                try:
+                    self._merge_from_disk()
+                    yield
+                    if write:
+                        self._write_store()
+                finally:
+                    self._store_depth -= 1
+    
+    def _save_tasks(self):
+        """保存任务（合并其他进程的修改，写入临时文件后替换）"""
+        try:
+            with self._store_transaction():
+                pass
             
             logger.debug("任务保存成功")
             
         except Exception as e:
             logger.error(f"保存任务失败: {e}")
     
+    def set_result_pipeline(self, pipeline: Optional[Pipeline]) -> None:
+        """设置任务完成后接收结果的流水线（传入None取消）"""
+        self._result_pipeline = pipeline
+    
+    def _collect_results(self, task: Task, feed_pipeline: bool = True) -> ResultSummary:
+        """一次遍历数据集：累计结果摘要，同时将数据项送入结果流水线"""
+        builder = SummaryBuilder(preview_size=config_manager.app.summary_preview_size)
+        pipeline = self._result_pipeline if feed_pipeline else None
+        complete = True
+        
+        try:
+            for item in apify_client.iterate_dataset_items(task.dataset_id, account=task.account):
+                builder.add(item)
+                if pipeline is not None:
+                    try:
+                        pipeline.put(item)
+                    except Exception as e:
+                        logger.error(f"任务结果送入流水线失败: {task.name}, 错误: {e}")
+                        pipeline = None
+        except Exception as e:
+            complete = False
+            logger.error(f"读取任务结果失败: {task.name}, 错误: {e}")
+        
+        self._save_preview(task.id, builder.preview)
+        return builder.build(complete=complete)
+    
+    def _preview_file(self, task_id: str) -> Path:
+        return self._data_dir / "summaries" / f"{task_id}.json"
+    
+    def _save_preview(self, task_id: str, items: List[Dict[str, Any]]):
+        """保存结果预览（不写入任务文件，避免任务文件随预览膨胀）"""
+        preview_file = self._preview_file(task_id)
+        try:
+            preview_file.parent.mkdir(parents=True, exist_ok=True)
+            serialization.dump_file(items, preview_file, atomic=True)
+        except Exception as e:
+            logger.error(f"保存结果预览失败: {task_id}, 错误: {e}")
+    
+    def _move_previews(self, summaries_dir: Path):
+        """将结果预览移动到新目录"""
+        old_dir = self._data_dir / "summaries"
+        if not old_dir.is_dir():
+            return
+        summaries_dir.mkdir(parents=True, exist_ok=True)
+        for preview_file in old_dir.glob("*.json"):
+            shutil.move(str(preview_file), str(summaries_dir / preview_file.name))
+    
+    def _remove_preview(self, task_id: str):
+        try:
+            self._preview_file(task_id).unlink()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"删除结果预览失败: {task_id}, 错误: {e}")
+    
     def create_task(self, name: str, actor_id: str, input_data: Dict[str, Any] = None, 
-                   description: str = None, **kwargs) -> Task:
+                   description: str = None, tags: List[str] = None, **kwargs) -> Task:
         """创建任务"""
         config = TaskConfig(
             actor_id=actor_id,
@@ -114,15 +328,61 @@ class TaskManager:
         task = Task(
             name=name,
             description=description,
-            config=config
+            config=config,
+            tags=tags or []
         )
         
-        self._tasks[task.id] = task
-        self._save_tasks()
+        try:
+            with self._store_transaction():
+                self._tasks[task.id] = task
+        except Exception as e:
+            # 保存失败时任务仍保留在内存中，下次保存时写入
+            logger.error(f"保存任务失败: {e}")
         
         logger.info(f"创建任务: {task.name} ({task.id})")
         return task
     
+    @staticmethod
+    def build_task(spec: Dict[str, Any]) -> Task:
+        """按定义构建任务（不保存），定义无效时抛出ValueError
+
+        spec包含 ``name``、``actor_id``，可选 ``input_data``、``description``、
+        ``tags`` 以及TaskConfig的其他字段。
+        """
+        if not isinstance(spec, dict):
+            raise ValueError("任务定义必须是对象")
+        
+        spec = dict(spec)
+        if not spec.get("name"):
+            raise ValueError("缺少name字段")
+        tags = spec.pop("tags", None)
+        try:
+            return Task(
+                name=spec.pop("name"),
+                description=spec.pop("description", None),
+                config=TaskConfig(**spec),
+                tags=tags or []
+            )
+        except ValidationError as e:
+            errors = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            raise ValueError(errors) from None
+    
+    def add_tasks(self, tasks: List[Task]) -> List[Task]:
+        """批量加入已构建的任务，只保存一次任务文件"""
+        try:
+            with self._store_transaction():
+                for task in tasks:
+                    self._tasks[task.id] = task
+        except Exception as e:
+            logger.error(f"保存任务失败: {e}")
+        
+        logger.info(f"批量创建任务: {len(tasks)} 个")
+        return tasks
+    
+    def create_tasks(self, specs: List[Dict[str, Any]]) -> List[Task]:
+        """批量创建任务，任一定义无效时抛出ValueError且不创建任何任务"""
+        return self.add_tasks([self.build_task(spec) for spec in specs])
+    
     def get_task(self, task_id: str) -> Optional[Task]:
         """获取任务"""
         return self._tasks.get(task_id)
@@ -145,35 +405,39 @@ class TaskManager:
             logger.error(f"任务不存在: {task_id}")
             return False
         
-        if task.status != TaskStatus.PENDING:
-            logger.error(f"任务状态不允许运行: {task.status}")
-            return False
-        
-        if not apify_client.is_ready():
-            logger.error("Apify客户端未就绪")
-            task.status = TaskStatus.FAILED
-            task.error_message = "Apify客户端未就绪"
-            self._save_tasks()
-            return False
-        
-        try:
+        # 状态检查与置为运行中在文件锁内原子完成，避免多线程/多进程重复运行
+        with self._store_transaction():
+            if task.status != TaskStatus.PENDING:
+                logger.error(f"任务状态不允许运行: {task.status}")
+                return False
+            
+            if not apify_client.is_ready():
+                logger.error("Apify客户端未就绪")
+                task.status = TaskStatus.FAILED
+                task.error_message = "Apify客户端未就绪"
+                return False
+            
             # 更新任务状态
             task.status = TaskStatus.RUNNING
             task.started_at = datetime.now()
-            self._save_tasks()
-            
+            if task_profiler.enabled:
+                task.profile_dir = str(task_profiler.report_dir(task.id))
+        
+        try:
             logger.info(f"开始运行任务: {task.name}")
             
             # 运行Actor
-            actor_run = apify_client.run_actor(
-                actor_id=task.config.actor_id,
-                run_input=task.config.input_data
-            )
+            with task_profiler.profile(task.id, "run_actor"):
+                actor_run = apify_client.run_actor(
+                    actor_id=task.config.actor_id,
+                    run_input=task.config.input_data
+                )
             
             if not actor_run:
                 raise Exception("Actor运行失败")
             
             task.run_id = actor_run.id
+            task.account = actor_run.account
             
             # 检查运行状态
             if actor_run.status == "SUCCEEDED":
@@ -183,12 +447,14 @@ class TaskManager:
                 # 获取数据集ID
                 if actor_run.output and 'datasetId' in actor_run.output:
                     task.dataset_id = actor_run.output['datasetId']
-                    
-                    # 获取结果数量
-                    dataset_items = apify_client.get_dataset_items(
-                        task.dataset_id, limit=1
-                    )
-                    task.result_count = len(dataset_items)
+                else:
+                    task.dataset_id = actor_run.default_dataset_id
+                
+                if task.dataset_id:
+                    # 单次流式遍历获取精确数量与摘要
+                    with task_profiler.profile(task.id, "fetch_results"):
+                        task.summary = self._collect_results(task)
+                    task.result_count = task.summary.item_count
                 
                 logger.info(f"任务完成: {task.name}, 结果数量: {task.result_count}")
                 
@@ -197,7 +463,8 @@ class TaskManager:
                 task.error_message = f"Actor运行状态: {actor_run.status}"
                 logger.error(f"任务失败: {task.name}, 状态: {actor_run.status}")
             
-            self._save_tasks()
+            with task_profiler.profile(task.id, "save_tasks"):
+                self._save_tasks()
             return task.status == TaskStatus.COMPLETED
             
         except Exception as e:
@@ -216,29 +483,135 @@ class TaskManager:
             logger.error(f"任务不存在: {task_id}")
             return False
         
-        if task.status not in [TaskStatus.PENDING, TaskStatus.RUNNING]:
-            logger.error(f"任务状态不允许取消: {task.status}")
-            return False
-        
-        task.status = TaskStatus.CANCELLED
-        task.completed_at = datetime.now()
-        self._save_tasks()
+        with self._store_transaction():
+            if task.status not in [TaskStatus.PENDING, TaskStatus.RUNNING]:
+                logger.error(f"任务状态不允许取消: {task.status}")
+                return False
+            
+            task.status = TaskStatus.CANCELLED
+            task.completed_at = datetime.now()
         
         logger.info(f"任务已取消: {task.name}")
         return True
     
     def delete_task(self, task_id: str) -> bool:
         """删除任务"""
-        if task_id not in self._tasks:
+        with self._store_transaction():
+            if task_id not in self._tasks:
+                logger.error(f"任务不存在: {task_id}")
+                return False
+            
+            task = self._tasks.pop(task_id)
+        
+        self._remove_preview(task_id)
+        logger.info(f"任务已删除: {task.name}")
+        return True
+    
+    def apply_retention(self, policy: Optional[RetentionPolicy] = None) -> int:
+        """按保留策略将已结束的旧任务移入归档，返回归档数量"""
+        policy = policy or RetentionPolicy()
+        
+        # 在文件锁内选出并移除，避免与其他进程的修改交错
+        with self._store_transaction():
+            now = datetime.now()
+            
+            finished = [
+                task for task in self._tasks.values() if task.status in policy.statuses
+            ]
+            expired = {}
+            for task in finished:
+                finished_at = task.completed_at or task.created_at
+                max_ages = [policy.tag_max_age_days[tag] for tag in task.tags
+                            if tag in policy.tag_max_age_days]
+                if policy.max_age_days is not None:
+                    max_ages.append(policy.max_age_days)
+                if max_ages and now - finished_at > timedelta(days=min(max_ages)):
+                    expired[task.id] = task
+            
+            # 超出数量上限时再按时间从旧到新归档已结束任务
+            if policy.max_tasks is not None:
+                overflow = len(self._tasks) - len(expired) - policy.max_tasks
+                if overflow > 0:
+                    remaining = sorted(
+                        (task for task in finished if task.id not in expired),
+                        key=lambda x: x.created_at
+                    )
+                    for task in remaining[:overflow]:
+                        expired[task.id] = task
+            
+            if not expired:
+                return 0
+            
+            count = self._archive.append(expired.values())
+            for task_id in expired:
+                del self._tasks[task_id]
+                # 归档保留摘要统计，预览随任务移出
+                self._remove_preview(task_id)
+        
+        logger.info(f"归档了 {count} 个任务, 剩余 {len(self._tasks)} 个")
+        return count
+    
+    def query_archive(self, start: Optional[date] = None, end: Optional[date] = None,
+                      status: Optional[TaskStatus] = None, task_id: Optional[str] = None,
+                      name_contains: Optional[str] = None) -> List[Task]:
+        """查询已归档任务（按创建日期范围读取对应分区）"""
+        tasks = []
+        for task in self._archive.iterate(start, end):
+            if task_id and task.id != task_id:
+                continue
+            if status and task.status != status:
+                continue
+            if name_contains and name_contains not in task.name:
+                continue
+            tasks.append(task)
+        
+        tasks.sort(key=lambda x: x.created_at, reverse=True)
+        return tasks
+    
+    def compact_archive(self) -> Dict[str, int]:
+        """压缩归档分区
+        
+        与apply_retention持有同一个文件锁，避免其他进程在读取与替换分区之间追加的任务丢失。
+        """
+        with self._store_transaction(write=False):
+            return self._archive.compact()
+    
+    def purge_archive(self, before: date) -> int:
+        """删除早于指定日期的归档分区"""
+        with self._store_transaction(write=False):
+            return self._archive.remove_before(before)
+    
+    def get_task_summary(self, task_id: str, refresh: bool = False) -> Optional[ResultSummary]:
+        """获取任务结果摘要，没有摘要（旧任务）或 ``refresh`` 为True时遍历数据集重新计算"""
+        task = self.get_task(task_id)
+        if not task:
             logger.error(f"任务不存在: {task_id}")
-            return False
+            return None
+        
+        if task.summary is not None and not refresh:
+            return task.summary
         
-        task = self._tasks[task_id]
-        del self._tasks[task_id]
+        if not task.dataset_id:
+            logger.error(f"任务数据集不存在: {task_id}")
+            return None
+        
+        with task_profiler.profile(task.id, "summarize"):
+            task.summary = self._collect_results(task, feed_pipeline=False)
+        task.result_count = task.summary.item_count
         self._save_tasks()
+        return task.summary
+    
+    def get_task_preview(self, task_id: str) -> List[Dict[str, Any]]:
+        """获取运行时保存的前N条结果预览，没有预览时返回空列表"""
+        preview_file = self._preview_file(task_id)
+        if not preview_file.exists():
+            return []
         
-        logger.info(f"任务已删除: {task.name}")
-        return True
+        try:
+            return serialization.load_file(preview_file)
+        except Exception as e:
+            logger.error(f"读取结果预览失败: {task_id}, 错误: {e}")
+            return []
     
     def get_task_results(self, task_id: str, limit: int = 100) -> List[Dict[str, Any]]:
         """获取任务结果"""
@@ -247,8 +620,11 @@ class TaskManager:
             logger.error(f"任务或数据集不存在: {task_id}")
             return []
         
-        dataset_items = apify_client.get_dataset_items(task.dataset_id, limit=limit)
-        return [item.data for item in dataset_items]
+        with task_profiler.profile(task.id, "get_results"):
+            dataset_items = apify_client.get_dataset_items(
+                task.dataset_id, limit=limit, account=task.account
+            )
+            return [item.data for item in dataset_items]
     
     def export_task_results(self, task_id: str, format: str = "json") -> Optional[bytes]:
         """导出任务结果"""
@@ -257,7 +633,10 @@ class TaskManager:
             logger.error(f"任务或数据集不存在: {task_id}")
             return None
         
-        return apify_client.download_dataset(task.dataset_id, format=format)
+        with task_profiler.profile(task.id, "export"):
+            return apify_client.download_dataset(
+                task.dataset_id, format=format, account=task.account
+            )
 
 
 # 全局任务管理器实例
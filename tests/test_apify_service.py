@@ -0,0 +1,116 @@
+"""多账号Token池测试：负载最低选择、配额切换与运行/数据集的账号路由"""
+
+import pytest
+
+from src import apify_service
+from src.apify_service import ApifyDataClient, TokenSlot
+from src.config import ApifyConfig, config_manager
+
+
+class QuotaError(Exception):
+    status_code = 429
+
+
+class FakeClient:
+    """记录调用的假ApifyClient，``quota`` 为真时所有运行返回429"""
+
+    def __init__(self, token):
+        self.token = token
+        self.quota = False
+        self.calls = []
+
+    def actor(self, actor_id):
+        return self
+
+    def call(self, run_input=None):
+        self.calls.append("call")
+        if self.quota:
+            raise QuotaError("Monthly usage hard limit exceeded")
+        run_id = f"run-{self.token}-{len(self.calls)}"
+        return {"id": run_id, "status": "SUCCEEDED", "defaultDatasetId": f"ds-{run_id}"}
+
+    def run(self, run_id):
+        self.calls.append(("run", run_id))
+        return self
+
+    def get(self):
+        return {"status": "SUCCEEDED"}
+
+
+@pytest.fixture
+def make_client(monkeypatch):
+    clients = {}
+    monkeypatch.setattr(apify_service.client_factory, "apify_client",
+                        lambda token: clients.setdefault(token, FakeClient(token)))
+    instances = []
+
+    def factory(tokens=("a", "b", "c"), **kwargs):
+        monkeypatch.setattr(config_manager, "_apify_config",
+                            ApifyConfig(api_token=tokens[0], api_tokens=list(tokens[1:]), **kwargs))
+        client = ApifyDataClient()
+        instances.append(client)
+        return client, clients
+
+    yield factory
+    for client in instances:
+        config_manager.unsubscribe(client._on_config_change)
+
+
+def account_of(token):
+    return TokenSlot(token, None).account
+
+
+def test_acquire_picks_least_loaded_account(make_client):
+    client, _ = make_client(max_runs_per_token=1)
+
+    first = client._acquire_slot(set())
+    second = client._acquire_slot(set())
+    third = client._acquire_slot(set())
+    assert len({first.account, second.account, third.account}) == 3
+
+    # 全部达到单Token上限时仍选择负载最低的账号
+    client._release_slot(second)
+    assert client._acquire_slot(set()) is second
+
+    client._release_slot(first, quota_error=True)
+    client._release_slot(third)
+    assert client._acquire_slot(set()) is third
+    assert first.failures == 1
+
+
+def test_quota_error_fails_over_to_next_account(make_client):
+    client, clients = make_client()
+    clients["a"].quota = True
+    clients["b"].quota = True
+
+    run = client.run_actor("actor/x")
+
+    assert run.account == account_of("c")
+    status = {slot["account"]: slot for slot in client.pool_status()}
+    assert status[account_of("a")]["cooling"] and status[account_of("b")]["cooling"]
+    assert not status[account_of("c")]["cooling"]
+    assert all(slot["active_runs"] == 0 for slot in status.values())
+
+    # 所有账号都触发配额时放弃
+    clients["c"].quota = True
+    assert client.run_actor("actor/x") is None
+
+
+def test_reads_are_routed_to_the_owning_account(make_client, monkeypatch):
+    client, clients = make_client()
+    run = client.run_actor("actor/x")
+    owner = next(c for c in clients.values() if c.calls)
+    other = next(c for c in clients.values() if c is not owner)
+
+    assert client._client_for(run.default_dataset_id) is owner
+    client.get_run_status(run.id)
+    assert owner.calls[-1] == ("run", run.id)
+    assert client._client_for("unknown", account=account_of(other.token)) is other
+
+    # 路由表有上限，最早的条目被淘汰，仍可通过任务记录中的账号访问
+    monkeypatch.setattr(apify_service, "MAX_ROUTES", 4)
+    for index in range(4):
+        client._remember_route(account_of(other.token), f"ds-{index}")
+    assert len(client._routes) == 4
+    assert run.default_dataset_id not in client._routes
+    assert client._client_for(run.default_dataset_id, account=run.account) is owner
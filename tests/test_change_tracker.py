@@ -0,0 +1,25 @@
+"""商品变更检测测试"""
+
+from src.change_tracker import ProductChangeTracker
+
+
+def test_detects_price_change(tmp_path):
+    tracker = ProductChangeTracker(state_dir=str(tmp_path))
+    assert tracker.update([{"product_id": "p1", "price": "10"}]) == []
+
+    event, = tracker.update([{"product_id": "p1", "price": 12}])
+
+    assert (event.product_id, event.field, event.old_value, event.new_value) == ("p1", "price", 10.0, 12.0)
+
+
+def test_compact_keeps_lines_appended_by_other_instances(tmp_path):
+    first = ProductChangeTracker(state_dir=str(tmp_path))
+    second = ProductChangeTracker(state_dir=str(tmp_path))
+
+    first.update([{"product_id": "p1", "price": 10}])
+    second.update([{"product_id": "p2", "price": 20}])
+    first.compact()
+
+    reloaded = ProductChangeTracker(state_dir=str(tmp_path))
+    assert reloaded.get_state("p1")["price"] == 10
+    assert reloaded.get_state("p2")["price"] == 20
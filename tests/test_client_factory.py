@@ -0,0 +1,36 @@
+"""Apify客户端超时测试，使用httpx.MockTransport记录逐请求超时"""
+
+import httpx
+import pytest
+
+from src.client_factory import ClientFactory
+from src.config import config_manager
+
+
+@pytest.fixture
+def factory(monkeypatch):
+    factory = ClientFactory()
+    yield factory
+    config_manager.unsubscribe(factory._on_config_change)
+    factory.close()
+
+
+def test_bulk_reads_keep_library_ceiling_and_connect_uses_config(factory, monkeypatch):
+    timeouts = []
+
+    def handler(request):
+        timeouts.append(request.extensions["timeout"])
+        return httpx.Response(200, json={"data": {"id": "d"}})
+
+    monkeypatch.setattr(factory, "_settings", lambda: (30, 0, 10, 30))
+    monkeypatch.setattr(factory, "_shared_transport",
+                        lambda pool_size, keepalive: httpx.MockTransport(handler))
+    client = factory.apify_client("token")
+
+    client.dataset("d").get()
+    client.http_client.call(method="GET", url="https://api.apify.com/v2/datasets/d/items",
+                            parse_response=False)
+
+    small, bulk = timeouts
+    assert small == {"connect": 5, "pool": 5, "read": 5, "write": 5}
+    assert bulk == {"connect": 30, "pool": 30, "read": 360, "write": 360}
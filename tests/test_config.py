@@ -0,0 +1,38 @@
+"""配置加载与热加载测试"""
+
+import pytest
+
+from src.config import ConfigManager
+
+
+@pytest.fixture
+def env_file(tmp_path, monkeypatch):
+    # ConfigManager会把文件中的值写入os.environ，测试结束后恢复
+    for key in ("APP_LOG_LEVEL", "APP_DATA_DIR", "APP_PROFILE_TOP", "APIFY_API_TOKEN"):
+        monkeypatch.delenv(key, raising=False)
+    return tmp_path / ".env"
+
+
+def test_invalid_log_level_keeps_current_config(env_file):
+    env_file.write_text("APP_LOG_LEVEL=debug\n")
+    manager = ConfigManager(env_files=[str(env_file)])
+    assert manager.app.log_level == "DEBUG"
+
+    received = []
+    manager.subscribe(received.append)
+    env_file.write_text("APP_LOG_LEVEL=BOGUS\n")
+
+    assert manager.reload() == {}
+    assert manager.app.log_level == "DEBUG"
+    assert received == []
+
+
+def test_invalid_app_value_does_not_drop_other_settings(env_file, tmp_path):
+    env_file.write_text(
+        f"APP_PROFILE_TOP=abc\nAPP_DATA_DIR={tmp_path / 'data'}\nAPIFY_API_TOKEN=token\n"
+    )
+    manager = ConfigManager(env_files=[str(env_file)])
+
+    assert manager.is_configured()
+    assert manager.app.data_dir == str(tmp_path / "data")
+    assert manager.app.profile_top == 30
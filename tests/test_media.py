@@ -0,0 +1,182 @@
+"""媒体下载测试，使用本地HTTP服务模拟CDN"""
+
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+import requests
+
+from src.media import MediaDownloader
+
+IMAGE = bytes(range(256)) * 64  # 16KB
+OTHER = b"other-image" * 100
+
+
+class _StandIn:
+    """本地HTTP替身：按路径返回内容，可关闭Range支持，并记录请求头"""
+
+    def __init__(self):
+        self.files = {}
+        self.range_support = True
+        self.requests = []
+
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stand_in.requests.append((self.path, self.headers.get("Range")))
+                body = stand_in.files.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+
+                range_header = self.headers.get("Range")
+                if range_header and stand_in.range_support:
+                    start = int(range_header.split("=")[1].split("-")[0])
+                    if start >= len(body):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(body)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+                    body = body[start:]
+                else:
+                    self.send_response(200)
+
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}{path}"
+
+
+@pytest.fixture
+def stand_in():
+    server = _StandIn()
+    server.thread.start()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
+
+
+@pytest.fixture
+def make_downloader(tmp_path):
+    session = requests.Session()
+
+    def factory(**kwargs):
+        return MediaDownloader(media_dir=str(tmp_path / "media"), session=session, **kwargs)
+
+    yield factory
+    session.close()
+
+
+def _partial_file(downloader: MediaDownloader, url: str) -> Path:
+    url_key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return downloader._partial_dir / f"{url_key}.part"
+
+
+def test_same_content_under_two_urls_is_stored_once(stand_in, make_downloader):
+    stand_in.files = {"/a.jpg": IMAGE, "/b/cover": IMAGE}
+    downloader = make_downloader()
+
+    result = downloader.download_all([stand_in.url("/a.jpg"), stand_in.url("/b/cover")])
+
+    assert result["downloaded"] == 2
+    paths = {Path(path) for path in result["paths"].values()}
+    assert len(paths) == 1
+    assert paths.pop().read_bytes() == IMAGE
+    assert len(list(downloader._objects_dir.rglob("*.*"))) == 1
+    assert downloader.total_bytes == len(IMAGE)
+
+    # 新实例从索引日志恢复，不再发起请求
+    request_count = len(stand_in.requests)
+    reloaded = make_downloader()
+    assert reloaded.download(stand_in.url("/a.jpg")) is not None
+    assert len(stand_in.requests) == request_count
+
+    # 合并进快照后同样可以恢复
+    reloaded.compact_index()
+    assert not reloaded._journal_file.exists()
+    assert make_downloader().get_path(stand_in.url("/b/cover")) is not None
+
+
+def test_resume_with_range(stand_in, make_downloader):
+    stand_in.files = {"/video.mp4": IMAGE}
+    downloader = make_downloader()
+    url = stand_in.url("/video.mp4")
+    _partial_file(downloader, url).write_bytes(IMAGE[:5000])
+
+    path = downloader.download(url)
+
+    assert path.read_bytes() == IMAGE
+    assert stand_in.requests == [("/video.mp4", "bytes=5000-")]
+
+
+def test_resume_requested_but_server_returns_full_body(stand_in, make_downloader):
+    stand_in.files = {"/video.mp4": IMAGE}
+    stand_in.range_support = False
+    downloader = make_downloader()
+    url = stand_in.url("/video.mp4")
+    _partial_file(downloader, url).write_bytes(b"stale-bytes")
+
+    path = downloader.download(url)
+
+    assert path.read_bytes() == IMAGE
+    assert stand_in.requests[0][1] == "bytes=11-"
+
+
+def test_range_not_satisfiable_restarts_download(stand_in, make_downloader):
+    stand_in.files = {"/a.jpg": IMAGE}
+    downloader = make_downloader()
+    url = stand_in.url("/a.jpg")
+    _partial_file(downloader, url).write_bytes(IMAGE + b"extra")
+
+    path = downloader.download(url)
+
+    assert path.read_bytes() == IMAGE
+    assert [header for _, header in stand_in.requests] == [f"bytes={len(IMAGE) + 5}-", None]
+
+
+def test_file_budget(stand_in, make_downloader):
+    stand_in.files = {"/a.jpg": IMAGE}
+    downloader = make_downloader(max_file_bytes=len(IMAGE) - 1)
+    url = stand_in.url("/a.jpg")
+
+    assert downloader.download(url) is None
+    assert not _partial_file(downloader, url).exists()
+    assert downloader.total_bytes == 0
+
+
+def test_total_budget(stand_in, make_downloader):
+    stand_in.files = {"/a.jpg": IMAGE, "/b.jpg": OTHER}
+    downloader = make_downloader(max_total_bytes=len(IMAGE) + len(OTHER) - 1)
+
+    assert downloader.download(stand_in.url("/a.jpg")) is not None
+    assert downloader.download(stand_in.url("/b.jpg")) is None
+    assert downloader.total_bytes == len(IMAGE)
+
+
+def test_compact_keeps_entries_appended_by_other_instances(stand_in, make_downloader):
+    stand_in.files = {"/a.jpg": IMAGE, "/b.jpg": OTHER}
+    first = make_downloader()
+    second = make_downloader()
+
+    first.download(stand_in.url("/a.jpg"))
+    second.download(stand_in.url("/b.jpg"))
+    first.compact_index()
+
+    reloaded = make_downloader()
+    assert reloaded.get_path(stand_in.url("/a.jpg")) is not None
+    assert reloaded.get_path(stand_in.url("/b.jpg")) is not None
@@ -0,0 +1,40 @@
+"""流水线测试：并发惰性启动与落盘阶段统计"""
+
+import threading
+
+from src.pipeline import Pipeline, Stage, build_result_pipeline
+
+
+def test_concurrent_put_starts_workers_once():
+    pipeline = Pipeline([Stage("double", lambda item: item * 2, workers=2),
+                         Stage("sink", lambda item: item)])
+    barrier = threading.Barrier(8)
+
+    def producer(offset):
+        barrier.wait()
+        for value in range(offset, offset + 50):
+            pipeline.put(value)
+
+    threads = [threading.Thread(target=producer, args=(i * 50,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(pipeline._threads) == 3
+    stats = pipeline.close(timeout=10)
+    assert not any(thread.is_alive() for thread in pipeline._threads)
+    assert stats["stages"]["sink"]["emitted"] == 400
+
+
+def test_sink_returning_none_is_not_counted_as_dropped():
+    collected = []
+    pipeline = build_result_pipeline(collected.append)
+
+    stats = pipeline.run([{"id": 1}, {"id": 1}, {"id": 2, "title": " x "}, "bad"])
+
+    assert collected == [{"id": 1}, {"id": 2, "title": "x"}]
+    assert stats["stages"]["normalize"]["dropped"] == 1
+    assert stats["stages"]["dedup"]["dropped"] == 1
+    assert stats["stages"]["sink"]["emitted"] == 2
+    assert stats["stages"]["sink"]["dropped"] == 0
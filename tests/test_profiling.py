@@ -0,0 +1,56 @@
+"""任务剖析测试"""
+
+import threading
+import tracemalloc
+
+import pytest
+
+from src import profiling
+from src.config import config_manager
+from src.profiling import TaskProfiler
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_manager.app, "data_dir", str(tmp_path))
+    monkeypatch.setattr(config_manager.app, "profile_enabled", True)
+    monkeypatch.setattr(config_manager.app, "profile_cpu", True)
+    monkeypatch.setattr(config_manager.app, "profile_memory", True)
+    return TaskProfiler()
+
+
+def test_state_is_reset_when_section_raises(profiler):
+    with pytest.raises(RuntimeError):
+        with profiler.profile("t1", "fetch"):
+            raise RuntimeError("boom")
+
+    assert profiler._local.active is False
+    assert profiler._memory_users == 0
+    assert not tracemalloc.is_tracing()
+    record, = profiler.load_report("t1")
+    assert record["cpu_profile"] == "fetch-1.prof"
+
+
+def test_single_process_profiler_skips_concurrent_cpu_capture(profiler, monkeypatch):
+    # Python 3.12+ 全进程只能启用一个cProfile
+    monkeypatch.setattr(profiling, "_SINGLE_PROFILER", True)
+    monkeypatch.setattr(config_manager.app, "profile_memory", False)
+    started = threading.Event()
+    release = threading.Event()
+
+    def first():
+        with profiler.profile("t1", "fetch"):
+            started.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    started.wait(5)
+    with profiler.profile("t2", "fetch"):
+        pass
+    release.set()
+    thread.join()
+
+    assert profiler.load_report("t2")[0]["cpu_profile_skipped"] is True
+    assert "cpu_profile" in profiler.load_report("t1")[0]
+    assert profiler._cpu_busy is False
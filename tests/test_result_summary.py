@@ -0,0 +1,27 @@
+"""结果摘要测试"""
+
+from src.result_summary import SummaryBuilder
+
+
+def test_null_rates_include_fields_that_are_always_empty():
+    builder = SummaryBuilder()
+    for i in range(10):
+        builder.add({"id": i, "description": None, "title": "" if i % 2 else "t"})
+
+    summary = builder.build()
+
+    assert summary.null_rates == {"description": 1.0, "id": 0.0, "title": 0.5}
+
+
+def test_price_statistics_use_fallback_paths():
+    builder = SummaryBuilder(preview_size=2)
+    for price in (10, "20", {"min_price": 30}):
+        builder.add({"price": price})
+    builder.add({"#error": "blocked"})
+
+    summary = builder.build()
+
+    assert summary.item_count == 4
+    assert summary.error_count == 1
+    assert (summary.price.count, summary.price.min, summary.price.max, summary.price.mean) == (3, 10, 30, 20)
+    assert len(builder.preview) == 2
@@ -0,0 +1,139 @@
+"""调度器测试：cron解析、不含抖动的排期推算与重叠触发策略"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from src import scheduler as scheduler_module
+from src.config import config_manager
+from src.scheduler import CronExpression, OverlapPolicy, TaskScheduler
+
+
+@pytest.fixture
+def make_scheduler(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_manager.app, "data_dir", str(tmp_path / "data"))
+    schedulers = []
+
+    def factory():
+        scheduler = TaskScheduler(max_workers=2)
+        schedulers.append(scheduler)
+        return scheduler
+
+    yield factory
+    for scheduler in schedulers:
+        scheduler.stop()
+        config_manager.unsubscribe(scheduler._on_config_change)
+
+
+def test_cron_fields():
+    cron = CronExpression("*/15 9-17 * * 1-5")
+    assert cron.minutes == {0, 15, 30, 45}
+    assert cron.hours == set(range(9, 18))
+    assert cron.weekdays == {1, 2, 3, 4, 5}
+
+    # 0和7都表示周日
+    assert CronExpression("0 0 * * 7").weekdays == {0}
+    assert CronExpression("0 0 * * 5-7").weekdays == {5, 6, 0}
+
+
+@pytest.mark.parametrize("expression", [
+    "0 0 * * 9", "0 0 * * 6-9", "60 * * * *", "0 24 * * *", "0 0 0 * *", "0 0 * 13 *",
+    "*/0 * * * *", "0 0 * *",
+])
+def test_cron_rejects_out_of_range(expression):
+    with pytest.raises(ValueError):
+        CronExpression(expression)
+
+
+def test_cron_next_after():
+    # 2024-01-01是周一
+    monday = datetime(2024, 1, 1, 10, 7)
+    assert CronExpression("*/15 * * * *").next_after(monday) == datetime(2024, 1, 1, 10, 15)
+    assert CronExpression("0 9 * * 0").next_after(monday) == datetime(2024, 1, 7, 9, 0)
+    # 日和周同时受限时取并集：15号或周五
+    assert CronExpression("0 0 15 * 5").next_after(monday) == datetime(2024, 1, 5, 0, 0)
+    assert CronExpression("0 0 29 2 *").next_after(monday) == datetime(2024, 2, 29, 0, 0)
+    with pytest.raises(ValueError):
+        CronExpression("0 0 31 2 *").next_after(monday)
+
+
+def test_cron_that_never_fires_is_rejected(make_scheduler):
+    scheduler = make_scheduler()
+
+    assert scheduler.add_schedule("never", "actor/x", cron="0 0 31 2 *") is None
+    assert scheduler.list_schedules() == []
+
+    scheduler.start()
+    assert scheduler._thread is not None
+
+
+def test_next_base_ignores_jitter(make_scheduler):
+    scheduler = make_scheduler()
+    schedule = scheduler.add_schedule("jittered", "actor/x", interval_seconds=600, jitter_seconds=300)
+    base = datetime.now() - timedelta(seconds=10)
+
+    with scheduler._cond:
+        scheduler._next_base[schedule.id] = base
+        following = scheduler._following_base(schedule, base + timedelta(seconds=250))
+    assert following == base + timedelta(seconds=600)
+
+    # 落后超过抖动窗口时从当前时间重新计算，不补跑
+    with scheduler._cond:
+        scheduler._next_base[schedule.id] = base - timedelta(hours=2)
+        following = scheduler._following_base(schedule, base)
+    assert following > datetime.now()
+
+
+def test_overlap_skip_and_coalesce(make_scheduler, monkeypatch):
+    release = threading.Event()
+    runs = []
+
+    class FakeTaskManager:
+        def create_task(self, **kwargs):
+            return SimpleNamespace(id=f"task-{len(runs)}")
+
+        def run_task(self, task_id):
+            runs.append(task_id)
+            release.wait(5)
+
+    monkeypatch.setattr(scheduler_module, "task_manager", FakeTaskManager())
+    scheduler = make_scheduler()
+    skip = scheduler.add_schedule("skip", "actor/x", interval_seconds=60)
+    coalesce = scheduler.add_schedule("coalesce", "actor/x", interval_seconds=60,
+                                      overlap_policy=OverlapPolicy.COALESCE)
+
+    executor = ThreadPoolExecutor(max_workers=2)
+    with scheduler._cond:
+        scheduler._executor = executor
+        scheduler._stopped = False
+        for schedule in (skip, coalesce):
+            for _ in range(3):
+                scheduler._fire(schedule)
+    release.set()
+    executor.shutdown(wait=True)
+    with scheduler._cond:
+        scheduler._executor = None
+        scheduler._stopped = True
+
+    assert (skip.run_count, skip.skipped_count) == (1, 2)
+    # 运行期间的多次触发合并为一次补跑
+    assert (coalesce.run_count, coalesce.skipped_count) == (2, 2)
+    assert not scheduler._running
+
+
+def test_relocate_merges_existing_schedules(make_scheduler, tmp_path):
+    scheduler = make_scheduler()
+    mine = scheduler.add_schedule("mine", "actor/x", interval_seconds=60)
+
+    other_dir = tmp_path / "other"
+    config_manager.app.data_dir = str(other_dir)
+    other = make_scheduler()
+    theirs = other.add_schedule("theirs", "actor/x", interval_seconds=60)
+
+    assert scheduler.relocate(str(other_dir))
+
+    assert {schedule.id for schedule in scheduler.list_schedules()} == {mine.id, theirs.id}
+    assert {schedule.name for schedule in make_scheduler().list_schedules()} == {"mine", "theirs"}
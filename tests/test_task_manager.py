@@ -0,0 +1,135 @@
+"""任务存储测试：多个实例（模拟多个CLI进程）共享同一个任务文件"""
+
+import pytest
+
+from src import serialization
+from src.config import config_manager
+from src.task_manager import RetentionPolicy, TaskManager, TaskStatus, apify_client
+
+
+@pytest.fixture
+def make_manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_manager.app, "data_dir", str(tmp_path / "data"))
+    managers = []
+
+    def factory():
+        manager = TaskManager()
+        managers.append(manager)
+        return manager
+
+    yield factory
+    for manager in managers:
+        config_manager.unsubscribe(manager._on_config_change)
+
+
+def test_saves_from_other_instances_are_merged(make_manager):
+    a = make_manager()
+    b = make_manager()
+
+    task_a = a.create_task("a", "actor/x")
+    task_b, = b.create_tasks([{"name": "b", "actor_id": "actor/x"}])
+    a._save_tasks()
+
+    assert {task.name for task in make_manager().list_tasks()} == {"a", "b"}
+
+    # 其他实例的修改就地合并到未修改的任务上
+    a.cancel_task(task_a.id)
+    b.reload()
+    assert b.get_task(task_a.id).status == TaskStatus.CANCELLED
+
+    # 删除同样会传播，不会被其他实例的保存写回
+    b.delete_task(task_b.id)
+    a._save_tasks()
+    assert [task.name for task in make_manager().list_tasks()] == ["a"]
+
+
+def test_local_changes_win_over_stale_disk_copy(make_manager):
+    a = make_manager()
+    task = a.create_task("a", "actor/x")
+    b = make_manager()
+
+    b.get_task(task.id).description = "changed"
+    b._save_tasks()
+    a.create_task("c", "actor/x")
+
+    reloaded = make_manager()
+    assert reloaded.get_task(task.id).description == "changed"
+    assert len(reloaded.list_tasks()) == 2
+
+
+def test_build_task_rejects_invalid_specs():
+    with pytest.raises(ValueError, match="name"):
+        TaskManager.build_task({"actor_id": "actor/x"})
+    with pytest.raises(ValueError, match="max_items"):
+        TaskManager.build_task({"name": "n", "actor_id": "actor/x", "max_items": "abc"})
+
+
+def test_preview_is_kept_out_of_the_task_file(make_manager, monkeypatch):
+    items = [{"id": i, "price": i * 1.5, "title": "x" * 100} for i in range(50)]
+    monkeypatch.setattr(apify_client, "iterate_dataset_items", lambda *args, **kwargs: iter(items))
+    manager = make_manager()
+    task = manager.create_task("a", "actor/x")
+    task.dataset_id = "dataset"
+
+    summary = manager.get_task_summary(task.id)
+
+    assert summary.item_count == 50
+    assert manager.get_task_preview(task.id) == items[:10]
+    stored, = serialization.load_file(manager._tasks_file)
+    assert "preview" not in stored["summary"]
+
+    manager.delete_task(task.id)
+    assert manager.get_task_preview(task.id) == []
+
+
+def test_legacy_inline_preview_is_migrated(make_manager):
+    manager = make_manager()
+    task = manager.create_task("a", "actor/x")
+    data, = serialization.load_file(manager._tasks_file)
+    data["summary"] = {"item_count": 1, "preview": [{"id": 1}]}
+    serialization.dump_file([data], manager._tasks_file)
+
+    reloaded = make_manager()
+    assert reloaded.get_task(task.id).summary.item_count == 1
+    assert reloaded.get_task_preview(task.id) == [{"id": 1}]
+
+
+def test_relocate_moves_archive_and_merges_existing_tasks(make_manager, tmp_path):
+    manager = make_manager()
+    archived = manager.create_task("archived", "actor/x")
+    manager.cancel_task(archived.id)
+    manager.create_task("live", "actor/x")
+    assert manager.apply_retention(RetentionPolicy(max_age_days=None, max_tasks=1)) == 1
+
+    other_dir = tmp_path / "other"
+    other_dir.mkdir()
+    existing = TaskManager.build_task({"name": "existing", "actor_id": "actor/x"})
+    serialization.dump_file([existing.dict()], other_dir / "tasks.json")
+
+    assert manager.relocate(str(other_dir))
+
+    assert {task.name for task in manager.list_tasks()} == {"live", "existing"}
+    assert [task.id for task in manager.query_archive()] == [archived.id]
+    assert {task["name"] for task in serialization.load_file(other_dir / "tasks.json")} == {"live", "existing"}
+
+
+def test_archive_compaction_holds_the_store_lock(make_manager, monkeypatch):
+    fcntl = pytest.importorskip("fcntl")
+    manager = make_manager()
+    manager.create_task("a", "actor/x")
+    held = []
+
+    def compact():
+        with open(manager._lock_file, 'a+b') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                held.append(True)
+            else:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return {}
+
+    monkeypatch.setattr(manager._archive, "compact", compact)
+    manager.compact_archive()
+
+    assert held == [True]